@@ -0,0 +1,263 @@
+"""Benchmark do script.py contra uma árvore sintética de jobs.
+
+Gera os jobs com gerar_jobs.py, recria um banco MySQL local com schema.sql,
+sobe um FTP local e um Slack falso (servidores.py) e roda script.main()
+no mesmo processo. Ao final mostra jobs/s, instruções SQL por job, bytes
+enviados por FTP, chamadas ao Slack e a latência de cada etapa.
+
+Exemplo:
+    python benchmark/benchmark.py --jobs 1000 --workers 4 --mysql-user root --mysql-pass root
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import functools
+
+import pymysql
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, AQUI)
+sys.path.insert(0, os.path.dirname(AQUI))
+
+import gerar_jobs  # noqa: E402
+import servidores  # noqa: E402
+
+# Etapas medidas: nome no relatório -> função do script.py
+ETAPAS = {
+    "descoberta": "discover_jobs",
+    "parse_xml": "parse_xml",
+    "check_log": "check_log",
+    "find_imagem_id": "find_imagem_id",
+    "contexto": "load_image_contexts",
+    "derivados": "submit_preview_derivatives",
+    "upload_ftp": "upload_to_ftp",
+    "p00": "finalize_p00_rollup",
+    "slack_webhook": "_deliver_webhook",
+    "slack_dm": "_deliver_dm",
+}
+
+
+class Medidor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tempos = {}
+
+    def registrar(self, etapa, segundos):
+        with self._lock:
+            self.tempos.setdefault(etapa, []).append(segundos)
+
+    def envolver(self, etapa, fn):
+        @functools.wraps(fn)
+        def medido(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.registrar(etapa, time.perf_counter() - inicio)
+        return medido
+
+    def envolver_gerador(self, etapa, fn):
+        @functools.wraps(fn)
+        def medido(*args, **kwargs):
+            it = fn(*args, **kwargs)
+            while True:
+                inicio = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    self.registrar(etapa, time.perf_counter() - inicio)
+                    return
+                self.registrar(etapa, time.perf_counter() - inicio)
+                yield item
+        return medido
+
+    def resumo(self):
+        with self._lock:
+            tempos = {k: sorted(v) for k, v in self.tempos.items()}
+        out = {}
+        for etapa, valores in tempos.items():
+            out[etapa] = {
+                "chamadas": len(valores),
+                "total_s": round(sum(valores), 4),
+                "media_ms": round(1000 * sum(valores) / len(valores), 3),
+                "p95_ms": round(1000 * valores[min(len(valores) - 1, int(len(valores) * 0.95))], 3),
+            }
+        return out
+
+
+def preparar_banco(args, imagens):
+    """Recria o banco de teste e cadastra as imagens, responsáveis e usuários do Slack."""
+    admin = pymysql.connect(host=args.mysql_host, port=args.mysql_port, user=args.mysql_user,
+                            password=args.mysql_pass, charset="utf8mb4", autocommit=True)
+    with admin.cursor() as cur:
+        cur.execute(f"DROP DATABASE IF EXISTS `{args.mysql_db}`")
+        cur.execute(f"CREATE DATABASE `{args.mysql_db}` CHARACTER SET utf8mb4")
+        cur.execute(f"USE `{args.mysql_db}`")
+        with open(os.path.join(AQUI, "schema.sql"), encoding="utf-8") as f:
+            for stmt in f.read().split(";"):
+                if stmt.strip():
+                    cur.execute(stmt)
+        cur.executemany(
+            "INSERT INTO imagens_cliente_obra (idimagens_cliente_obra, imagem_nome, status_id, obra_id) "
+            "VALUES (%s, %s, %s, %s)",
+            [(i["id"], i["nome"], i["status_id"], i["obra_id"]) for i in imagens],
+        )
+        colaboradores = 20
+        cur.executemany(
+            "INSERT INTO funcao_imagem (imagem_id, colaborador_id, funcao_id, status) VALUES (%s, %s, %s, %s)",
+            [(i["id"], i["id"] % colaboradores + 1, 4, "Em andamento") for i in imagens]
+            + [(i["id"], (i["id"] + 7) % colaboradores + 1, 5, "Não iniciado") for i in imagens],
+        )
+        cur.executemany(
+            "INSERT INTO usuario (idcolaborador, nome_slack) VALUES (%s, %s)",
+            [(c, f"Colaborador {c}") for c in range(1, colaboradores + 1)],
+        )
+    admin.close()
+    return [f"Colaborador {c}" for c in range(1, 21)]
+
+
+def contar_instrucoes(args):
+    conn = pymysql.connect(host=args.mysql_host, port=args.mysql_port, user=args.mysql_user,
+                           password=args.mysql_pass)
+    with conn.cursor() as cur:
+        cur.execute("SHOW GLOBAL STATUS WHERE Variable_name IN "
+                    "('Questions', 'Com_select', 'Com_insert', 'Com_update', 'Com_commit')")
+        valores = {k: int(v) for k, v in cur.fetchall()}
+    conn.close()
+    return valores
+
+
+def rodar(args):
+    base = args.dir or tempfile.mkdtemp(prefix="scriptsflow_bench_")
+    if os.path.exists(os.path.join(base, "jobs")) and not args.reusar:
+        shutil.rmtree(os.path.join(base, "jobs"), ignore_errors=True)
+        shutil.rmtree(os.path.join(base, "renders"), ignore_errors=True)
+    if not args.reusar or not os.path.exists(os.path.join(base, "imagens.json")):
+        print(f"🧪 Gerando {args.jobs} jobs em {base}")
+        t = time.perf_counter()
+        gerar_jobs.gerar(base, args.jobs, args.jobs_por_imagem, args.err_density, args.log_lines,
+                         args.jpgs, args.jpg_kb, seed=args.seed)
+        print(f"   pronto em {time.perf_counter() - t:.1f}s")
+    with open(os.path.join(base, "imagens.json"), encoding="utf-8") as f:
+        gerado = json.load(f)
+    shutil.rmtree(os.path.join(base, "state"), ignore_errors=True)
+
+    usuarios = preparar_banco(args, gerado["imagens"])
+    contadores = servidores.Contadores()
+    ftp = servidores.iniciar(servidores.FTPLocal(contadores))
+    slack = servidores.iniciar(servidores.SlackFalso(contadores, usuarios, latencia=args.slack_latencia / 1000))
+
+    os.environ.update({
+        "BACKBURNER_JOB_DIR": os.path.join(base, "jobs"),
+        "SCRIPTSFLOW_STATE_DIR": os.path.join(base, "state"),
+        "DB_HOST": args.mysql_host,
+        "DB_USER": args.mysql_user,
+        "DB_PASS": args.mysql_pass,
+        "DB_NAME": args.mysql_db,
+        "DB_PORT": str(args.mysql_port),
+        "FTP_HOST": "127.0.0.1",
+        "FTP_PORT": str(ftp.port),
+        "FTP_USER": "bench",
+        "FTP_PASS": "bench",
+        "SLACK_WEBHOOK_URL": slack.url + "/webhook",
+        "SLACK_API_URL": slack.url + "/api",
+        "FLOW_TOKEN": "xoxb-benchmark",
+    })
+
+    import script
+
+    medidor = Medidor()
+    for etapa, nome in ETAPAS.items():
+        fn = getattr(script, nome, None)
+        if fn is None:
+            continue
+        if nome == "discover_jobs":
+            setattr(script, nome, medidor.envolver_gerador(etapa, fn))
+        else:
+            setattr(script, nome, medidor.envolver(etapa, fn))
+    script.RenderWriteBuffer.flush = medidor.envolver("gravacao_lote", script.RenderWriteBuffer.flush)
+
+    relatorios = []
+    for rodada in range(1, args.rodadas + 1):
+        medidor.tempos.clear()
+        antes_db = contar_instrucoes(args)
+        antes = contadores.snapshot()
+        inicio = time.perf_counter()
+        script.main(full=False, workers=args.workers)
+        duracao = time.perf_counter() - inicio
+        depois_db = contar_instrucoes(args)
+        depois = contadores.snapshot()
+
+        # cada contar_instrucoes soma uma pergunta ao contador global
+        instrucoes = depois_db["Questions"] - antes_db["Questions"] - 1
+        delta = {k: depois.get(k, 0) - antes.get(k, 0) for k in depois}
+        relatorio = {
+            "rodada": rodada,
+            "jobs": gerado["jobs"],
+            "workers": args.workers,
+            "duracao_s": round(duracao, 3),
+            "jobs_por_s": round(gerado["jobs"] / duracao, 2) if duracao else None,
+            "db_instrucoes": instrucoes,
+            "db_instrucoes_por_job": round(instrucoes / gerado["jobs"], 2),
+            "db_por_tipo": {k: depois_db[k] - antes_db[k] for k in depois_db if k != "Questions"},
+            "ftp_bytes": delta.get("ftp_bytes", 0),
+            "ftp_arquivos": delta.get("ftp_arquivos", 0),
+            "ftp_sessoes": delta.get("ftp_sessoes", 0),
+            "slack": {k[len("slack "):]: v for k, v in delta.items() if k.startswith("slack ") and v},
+            "etapas": medidor.resumo(),
+            # métricas registradas pelo próprio script.py (instruções SQL por categoria etc.)
+            "metricas_script": script.metrics.summary(),
+        }
+        relatorios.append(relatorio)
+        imprimir(relatorio)
+
+    ftp.shutdown()
+    slack.shutdown()
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(relatorios, f, indent=2, ensure_ascii=False)
+        print(f"📄 Relatório gravado em {args.saida}")
+    if not args.dir:
+        shutil.rmtree(base, ignore_errors=True)
+    return relatorios
+
+
+def imprimir(r):
+    print(f"\n===== Rodada {r['rodada']}: {r['jobs']} jobs, {r['workers']} worker(s) =====")
+    print(f"Duração:            {r['duracao_s']:.2f}s ({r['jobs_por_s']} jobs/s)")
+    print(f"Instruções SQL:     {r['db_instrucoes']} ({r['db_instrucoes_por_job']} por job) {r['db_por_tipo']}")
+    print(f"FTP:                {r['ftp_bytes'] / 1048576:.1f} MiB em {r['ftp_arquivos']} arquivos, "
+          f"{r['ftp_sessoes']} sessões")
+    print(f"Slack:              {r['slack'] or 'nenhuma chamada'}")
+    print(f"{'etapa':<16}{'chamadas':>10}{'total s':>10}{'média ms':>11}{'p95 ms':>10}")
+    for etapa, e in sorted(r["etapas"].items(), key=lambda kv: -kv[1]["total_s"]):
+        print(f"{etapa:<16}{e['chamadas']:>10}{e['total_s']:>10.3f}{e['media_ms']:>11.3f}{e['p95_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do script.py com jobs sintéticos")
+    parser.add_argument("--jobs", type=int, default=100, help="quantidade de jobs (100 a 50000)")
+    parser.add_argument("--jobs-por-imagem", type=int, default=2)
+    parser.add_argument("--err-density", type=float, default=0.05)
+    parser.add_argument("--log-lines", type=int, default=200)
+    parser.add_argument("--jpgs", type=int, default=2)
+    parser.add_argument("--jpg-kb", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--rodadas", type=int, default=2,
+                        help="execuções seguidas (a partir da segunda mede a passada incremental)")
+    parser.add_argument("--slack-latencia", type=float, default=50, help="latência simulada do Slack em ms")
+    parser.add_argument("--dir", help="pasta de trabalho (mantida ao final); padrão: temporária")
+    parser.add_argument("--reusar", action="store_true", help="reaproveita os jobs já gerados em --dir")
+    parser.add_argument("--saida", help="grava o relatório em JSON")
+    parser.add_argument("--mysql-host", default="127.0.0.1")
+    parser.add_argument("--mysql-port", type=int, default=3306)
+    parser.add_argument("--mysql-user", default="root")
+    parser.add_argument("--mysql-pass", default="")
+    parser.add_argument("--mysql-db", default="scriptsflow_bench")
+    rodar(parser.parse_args())
@@ -0,0 +1,127 @@
+import os
+import io
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+
+try:
+    from PIL import Image
+except ImportError:  # sem Pillow os JPGs são só bytes aleatórios com cabeçalho JPEG
+    Image = None
+
+XML_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<Job>
+  <JobInfo>
+    <Name>{name}</Name>
+    <Description>{description}</Description>
+    <Computer>{computer}</Computer>
+    <Submitted>{submitted}</Submitted>
+    <LastUpdated>{last_updated}</LastUpdated>
+  </JobInfo>
+  <JobFlags>
+    <Active>{active}</Active>
+    <Complete>{complete}</Complete>
+  </JobFlags>
+  <Output>
+    <Name>{exr_path}</Name>
+  </Output>
+</Job>
+"""
+
+LOG_LINES = [
+    "INF\t2026/01/01 10:00:00\tFrame {frame} started on {computer}",
+    "INF\t2026/01/01 10:00:05\tRendering pass {frame}: 100% complete",
+    # "ERR" dentro de outra palavra: não é erro de render
+    "WRN\t2026/01/01 10:00:06\tMissing map: \\\\server\\maps\\wood_{frame}.jpg (ERRATA folder ignored)",
+    "INF\t2026/01/01 10:00:07\tFrame {frame} finished, output written",
+]
+ERR_LINE = "ERR\t2026/01/01 10:00:08\tFrame {frame}: render failed on {computer} (out of memory)"
+
+
+def _jpg_bytes(size_kb, rng):
+    if Image is not None:
+        side = max(64, int((size_kb * 1024 / 0.5) ** 0.5))
+        img = Image.effect_noise((side, side), 64).convert("RGB")
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=90)
+        return buf.getvalue()
+    return b"\xff\xd8\xff\xe0" + rng.randbytes(size_kb * 1024) + b"\xff\xd9"
+
+
+def gerar(destino, jobs=100, jobs_por_imagem=2, err_density=0.05, log_lines=200,
+          jpgs_por_job=2, jpg_kb=256, p00_ratio=0.3, seed=42):
+    """Cria destino/jobs (pastas do Backburner), destino/renders (saídas com JPGs)
+    e destino/imagens.json com as imagens usadas, para montar o banco de teste."""
+    rng = random.Random(seed)
+    jobs_dir = os.path.join(destino, "jobs")
+    renders_dir = os.path.join(destino, "renders")
+    os.makedirs(jobs_dir, exist_ok=True)
+    os.makedirs(renders_dir, exist_ok=True)
+
+    jpg = _jpg_bytes(jpg_kb, rng)
+    computers = [f"RENDER{n:02d}" for n in range(1, 13)]
+    total_imagens = max(1, jobs // max(1, jobs_por_imagem))
+    imagens = []
+    for i in range(total_imagens):
+        imagens.append({
+            "id": i + 1,
+            "nome": f"{i + 1:05d}_OBRA{i % 40:02d}_IMG_{i:05d}",
+            "status_id": 1 if rng.random() < p00_ratio else rng.choice((2, 3, 4)),
+            "obra_id": i % 40 + 1,
+        })
+
+    inicio = datetime(2026, 1, 1, 8, 0, 0)
+    for n in range(jobs):
+        imagem = imagens[n % total_imagens]
+        computer = rng.choice(computers)
+        job_dir = os.path.join(jobs_dir, f"JOB_{n:06d}")
+        out_dir = os.path.join(renders_dir, f"{imagem['nome']}_{n:06d}")
+        os.makedirs(job_dir, exist_ok=True)
+        os.makedirs(out_dir, exist_ok=True)
+
+        complete = rng.random() < 0.7
+        submitted = inicio + timedelta(minutes=n)
+        with open(os.path.join(job_dir, "JobInfo.xml"), "w", encoding="utf-8") as f:
+            f.write(XML_TEMPLATE.format(
+                name=imagem["nome"],
+                description=f"BG{n % 9 + 1}",
+                computer=computer,
+                submitted=submitted.strftime("%Y/%m/%d %H:%M:%S"),
+                last_updated=(submitted + timedelta(minutes=30)).strftime("%Y/%m/%d %H:%M:%S"),
+                active="No" if complete else "Yes",
+                complete="Yes" if complete else "No",
+                exr_path=os.path.join(out_dir, f"{imagem['nome']}.exr"),
+            ))
+
+        with open(os.path.join(job_dir, "log.txt"), "w", encoding="utf-8") as f:
+            for frame in range(log_lines):
+                if rng.random() < err_density:
+                    line = ERR_LINE
+                else:
+                    line = LOG_LINES[frame % len(LOG_LINES)]
+                f.write(line.format(frame=frame, computer=computer) + "\n")
+
+        for k in range(jpgs_por_job):
+            with open(os.path.join(out_dir, f"{imagem['nome']}_{k + 1:03d}.jpg"), "wb") as f:
+                f.write(jpg)
+
+    with open(os.path.join(destino, "imagens.json"), "w", encoding="utf-8") as f:
+        json.dump({"jobs": jobs, "imagens": imagens}, f)
+    return imagens
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera uma árvore sintética de jobs do Backburner")
+    parser.add_argument("destino")
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--jobs-por-imagem", type=int, default=2)
+    parser.add_argument("--err-density", type=float, default=0.05, help="fração de linhas ERR nos logs")
+    parser.add_argument("--log-lines", type=int, default=200)
+    parser.add_argument("--jpgs", type=int, default=2, help="JPGs por job")
+    parser.add_argument("--jpg-kb", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    gerar(args.destino, args.jobs, args.jobs_por_imagem, args.err_density, args.log_lines,
+          args.jpgs, args.jpg_kb, seed=args.seed)
+    print(f"✅ {args.jobs} jobs gerados em {args.destino}")
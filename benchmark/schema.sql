@@ -0,0 +1,79 @@
+-- Esquema mínimo do banco do Flow usado pelo script.py (só as colunas que ele lê ou grava)
+
+CREATE TABLE imagens_cliente_obra (
+    idimagens_cliente_obra INT PRIMARY KEY,
+    imagem_nome VARCHAR(255) NOT NULL,
+    status_id INT NOT NULL,
+    obra_id INT,
+    substatus_id INT,
+    KEY idx_imagem_nome (imagem_nome)
+) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE funcao_imagem (
+    idfuncao_imagem INT AUTO_INCREMENT PRIMARY KEY,
+    imagem_id INT NOT NULL,
+    colaborador_id INT,
+    funcao_id INT NOT NULL,
+    status VARCHAR(50),
+    prazo DATETIME,
+    KEY idx_imagem_funcao (imagem_id, funcao_id)
+) DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE usuario (
+    idusuario INT AUTO_INCREMENT PRIMARY KEY,
+    idcolaborador INT NOT NULL,
+    nome_slack VARCHAR(255),
+    KEY idx_colaborador (idcolaborador)
+) DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE colaborador (
+    idcolaborador INT AUTO_INCREMENT PRIMARY KEY,
+    nome_colaborador VARCHAR(255) NOT NULL,
+    imagem VARCHAR(255),
+    UNIQUE KEY uk_nome_colaborador (nome_colaborador)
+) DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE render_alta (
+    idrender_alta INT AUTO_INCREMENT PRIMARY KEY,
+    imagem_id INT NOT NULL,
+    responsavel_id INT,
+    status_id INT NOT NULL,
+    status VARCHAR(50),
+    data DATETIME,
+    computer VARCHAR(100),
+    submitted DATETIME(6),
+    last_updated DATETIME(6),
+    has_error TINYINT(1) DEFAULT 0,
+    errors TEXT,
+    job_folder VARCHAR(500),
+    previa_jpg VARCHAR(255),
+    numero_bg VARCHAR(100),
+    UNIQUE KEY uk_imagem_status (imagem_id, status_id)
+) DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE render_previews (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    render_id INT NOT NULL,
+    filename VARCHAR(255) NOT NULL,
+    UNIQUE KEY uk_render_filename (render_id, filename)
+) DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE pos_producao (
+    idpos_producao INT AUTO_INCREMENT PRIMARY KEY,
+    render_id INT,
+    imagem_id INT NOT NULL,
+    obra_id INT,
+    colaborador_id INT,
+    caminho_pasta VARCHAR(500),
+    numero_bg VARCHAR(100),
+    status_id INT,
+    responsavel_id INT,
+    UNIQUE KEY uk_imagem_status (imagem_id, status_id)
+) DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE notificacoes (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    colaborador_id INT,
+    mensagem TEXT,
+    criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,238 @@
+import json
+import socket
+import threading
+import posixpath
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class Contadores:
+    """Contadores compartilhados entre as threads dos servidores."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.valores = {}
+
+    def add(self, nome, n=1):
+        with self._lock:
+            self.valores[nome] = self.valores.get(nome, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.valores)
+
+
+# ---------------------------------------------------------------------------
+# FTP local: guarda só o tamanho dos arquivos recebidos
+# ---------------------------------------------------------------------------
+
+class _FTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode("utf-8"))
+
+    def _path(self, arg):
+        return posixpath.normpath(posixpath.join(self.cwd, arg)) if arg else self.cwd
+
+    def _data_connection(self):
+        if self.pasv is None:
+            return None
+        self.pasv.settimeout(30)
+        conn, _ = self.pasv.accept()
+        self.pasv.close()
+        self.pasv = None
+        return conn
+
+    def handle(self):
+        server = self.server
+        self.cwd = "/"
+        self.pasv = None
+        self.rest = 0
+        server.contadores.add("ftp_sessoes")
+        self.reply("220 servidor FTP local do benchmark")
+        for raw in self.rfile:
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            cmd, _, arg = line.partition(" ")
+            cmd = cmd.upper()
+            server.contadores.add("ftp_comandos")
+            if cmd == "USER":
+                self.reply("331 senha")
+            elif cmd == "PASS":
+                self.reply("230 ok")
+            elif cmd in ("SYST",):
+                self.reply("215 UNIX Type: L8")
+            elif cmd in ("TYPE", "NOOP", "MODE", "STRU"):
+                self.reply("200 ok")
+            elif cmd == "FEAT":
+                self.reply("211-recursos\r\n SIZE\r\n REST STREAM\r\n211 fim")
+            elif cmd == "PWD":
+                self.reply(f'257 "{self.cwd}"')
+            elif cmd == "CWD":
+                path = self._path(arg)
+                if path in server.dirs:
+                    self.cwd = path
+                    self.reply("250 ok")
+                else:
+                    self.reply("550 diretório inexistente")
+            elif cmd == "CDUP":
+                self.cwd = posixpath.dirname(self.cwd) or "/"
+                self.reply("250 ok")
+            elif cmd == "MKD":
+                path = self._path(arg)
+                with server.lock:
+                    server.dirs.add(path)
+                self.reply(f'257 "{path}" criado')
+            elif cmd == "PASV":
+                if self.pasv is not None:
+                    self.pasv.close()
+                self.pasv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self.pasv.bind(("127.0.0.1", 0))
+                self.pasv.listen(1)
+                port = self.pasv.getsockname()[1]
+                self.reply(f"227 Entering Passive Mode (127,0,0,1,{port >> 8},{port & 0xFF})")
+            elif cmd == "REST":
+                self.rest = int(arg or 0)
+                self.reply(f"350 reiniciando em {self.rest}")
+            elif cmd in ("STOR", "APPE"):
+                path = self._path(arg)
+                if posixpath.dirname(path) not in server.dirs:
+                    self.reply("553 diretório inexistente")
+                    continue
+                conn = self._data_connection()
+                if conn is None:
+                    self.reply("425 use PASV primeiro")
+                    continue
+                self.reply("150 enviando")
+                received = 0
+                with conn:
+                    while True:
+                        chunk = conn.recv(65536)
+                        if not chunk:
+                            break
+                        received += len(chunk)
+                if cmd == "APPE":
+                    start = server.files.get(path, 0)
+                else:
+                    start = self.rest
+                self.rest = 0
+                with server.lock:
+                    server.files[path] = start + received
+                server.contadores.add("ftp_bytes", received)
+                server.contadores.add("ftp_arquivos")
+                self.reply("226 recebido")
+            elif cmd == "SIZE":
+                size = server.files.get(self._path(arg))
+                self.reply(f"213 {size}" if size is not None else "550 arquivo inexistente")
+            elif cmd == "NLST":
+                conn = self._data_connection()
+                if conn is None:
+                    self.reply("425 use PASV primeiro")
+                    continue
+                self.reply("150 listagem")
+                with conn:
+                    prefix = self.cwd.rstrip("/") + "/"
+                    names = [p[len(prefix):] for p in list(server.files) + list(server.dirs)
+                             if p.startswith(prefix) and "/" not in p[len(prefix):]]
+                    conn.sendall("".join(n + "\r\n" for n in names).encode("utf-8"))
+                self.reply("226 ok")
+            elif cmd == "QUIT":
+                self.reply("221 tchau")
+                break
+            else:
+                self.reply("502 comando não implementado")
+        if self.pasv is not None:
+            self.pasv.close()
+
+
+class FTPLocal(socketserver.ThreadingTCPServer):
+    """Servidor FTP mínimo (PASV, STOR/APPE/REST, SIZE, MKD/CWD) que só conta bytes."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, contadores, host="127.0.0.1", port=0):
+        super().__init__((host, port), _FTPHandler)
+        self.contadores = contadores
+        self.lock = threading.Lock()
+        self.dirs = {"/"}
+        self.files = {}
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+# ---------------------------------------------------------------------------
+# Slack falso: webhook, users.list e chat.postMessage
+# ---------------------------------------------------------------------------
+
+class _SlackHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay(self):
+        if self.server.latencia:
+            threading.Event().wait(self.server.latencia)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.server.contadores.add(f"slack {url.path}")
+        self._delay()
+        if url.path.endswith("/users.list"):
+            params = parse_qs(url.query)
+            start = int((params.get("cursor") or ["0"])[0] or 0)
+            limit = int((params.get("limit") or ["200"])[0])
+            users = self.server.usuarios[start:start + limit]
+            next_cursor = str(start + limit) if start + limit < len(self.server.usuarios) else ""
+            self._json({
+                "ok": True,
+                "members": [{"id": f"U{start + i:06d}", "real_name": nome} for i, nome in enumerate(users)],
+                "response_metadata": {"next_cursor": next_cursor},
+            })
+        else:
+            self._json({"ok": False, "error": "unknown_method"}, 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        self.server.contadores.add(f"slack {url.path}")
+        self._delay()
+        if url.path.endswith("/chat.postMessage"):
+            self._json({"ok": True})
+        else:
+            body = b"ok"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+
+class SlackFalso(ThreadingHTTPServer):
+    """Responde como o Slack; latencia (segundos) simula o tempo de resposta da API."""
+
+    daemon_threads = True
+
+    def __init__(self, contadores, usuarios=(), latencia=0.0, host="127.0.0.1", port=0):
+        super().__init__((host, port), _SlackHandler)
+        self.contadores = contadores
+        self.usuarios = list(usuarios)
+        self.latencia = latencia
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+
+def iniciar(servidor):
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    return servidor
@@ -0,0 +1,130 @@
+import os
+import argparse
+import sqlite3
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+# Mesmo .env e mesmas variáveis que o script.py usa para decidir onde gravar o catálogo
+ENV_FILE = os.getenv("SCRIPTSFLOW_ENV", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+load_dotenv(ENV_FILE)
+PARENT_FOLDER = os.getenv("BACKBURNER_JOB_DIR", r"C:\Backburner_Job")
+STATE_DIR = os.getenv("SCRIPTSFLOW_STATE_DIR", os.path.join(PARENT_FOLDER, ".scriptsflow"))
+JOB_CATALOG = os.getenv("JOB_CATALOG", os.path.join(STATE_DIR, "catalog.sqlite3"))
+
+COLUNAS = ("job_folder", "name", "computer", "status", "has_error", "last_updated", "imagem_id")
+
+
+def imprimir(linhas, colunas):
+    if not linhas:
+        print("Nenhum job encontrado.")
+        return
+    larguras = [len(c) for c in colunas]
+    texto = [["" if v is None else str(v) for v in linha] for linha in linhas]
+    for linha in texto:
+        larguras = [max(l, len(v)) for l, v in zip(larguras, linha)]
+    print("  ".join(c.ljust(l) for c, l in zip(colunas, larguras)))
+    print("  ".join("-" * l for l in larguras))
+    for linha in texto:
+        print("  ".join(v.ljust(l) for v, l in zip(linha, larguras)))
+    print(f"\n{len(linhas)} linha(s)")
+
+
+def desde(dias):
+    return (datetime.now() - timedelta(days=dias)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def cmd_erros(db, args):
+    sql = f"SELECT {', '.join(COLUNAS)} FROM jobs WHERE has_error = 1 AND last_updated >= ?"
+    params = [desde(args.dias)]
+    if args.computador:
+        sql += " AND computer = ?"
+        params.append(args.computador)
+    sql += " ORDER BY last_updated DESC LIMIT ?"
+    imprimir(db.execute(sql, params + [args.limite]).fetchall(), COLUNAS)
+    if args.detalhes:
+        for (job_folder, errors) in db.execute(
+            "SELECT job_folder, errors FROM jobs WHERE has_error = 1 AND last_updated >= ? "
+            "ORDER BY last_updated DESC LIMIT ?", (desde(args.dias), args.limite)
+        ):
+            print(f"\n== {job_folder}\n{errors or ''}")
+
+
+def cmd_andamento(db, args):
+    sql = f"SELECT {', '.join(COLUNAS)} FROM jobs WHERE status = 'Em andamento'"
+    params = []
+    if args.computador:
+        sql += " AND computer = ?"
+        params.append(args.computador)
+    sql += " ORDER BY last_updated DESC LIMIT ?"
+    imprimir(db.execute(sql, params + [args.limite]).fetchall(), COLUNAS)
+
+
+def cmd_resumo(db, args):
+    linhas = db.execute(
+        "SELECT COALESCE(computer, '-'), status, COUNT(*), SUM(has_error), MAX(last_updated) "
+        "FROM jobs WHERE processed_at >= ? GROUP BY computer, status ORDER BY computer, status",
+        (desde(args.dias),),
+    ).fetchall()
+    imprimir(linhas, ("computer", "status", "jobs", "com_erro", "ultimo_update"))
+
+
+def cmd_buscar(db, args):
+    linhas = db.execute(
+        f"SELECT {', '.join(COLUNAS)} FROM jobs WHERE name LIKE ? OR job_folder LIKE ? "
+        "ORDER BY last_updated DESC LIMIT ?",
+        (f"%{args.termo}%", f"%{args.termo}%", args.limite),
+    ).fetchall()
+    imprimir(linhas, COLUNAS)
+
+
+def cmd_historico(db, args):
+    linhas = db.execute(
+        "SELECT h.job_folder, h.status, h.has_error, h.recorded_at FROM job_history h "
+        "JOIN jobs j ON j.job_folder = h.job_folder "
+        "WHERE j.name LIKE ? OR j.job_folder LIKE ? ORDER BY h.job_folder, h.recorded_at LIMIT ?",
+        (f"%{args.termo}%", f"%{args.termo}%", args.limite),
+    ).fetchall()
+    imprimir(linhas, ("job_folder", "status", "has_error", "recorded_at"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulta o catálogo local de jobs do Backburner")
+    parser.add_argument("--db", default=JOB_CATALOG, help="arquivo SQLite do catálogo")
+    parser.add_argument("--limite", type=int, default=100, help="máximo de linhas exibidas")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("erros", help="jobs com erro nos últimos dias")
+    p.add_argument("--dias", type=float, default=7)
+    p.add_argument("--computador")
+    p.add_argument("--detalhes", action="store_true", help="mostra o resumo de erros de cada job")
+    p.set_defaults(func=cmd_erros)
+
+    p = sub.add_parser("andamento", help="jobs ainda em andamento")
+    p.add_argument("--computador")
+    p.set_defaults(func=cmd_andamento)
+
+    p = sub.add_parser("resumo", help="contagem de jobs por computador e status")
+    p.add_argument("--dias", type=float, default=7)
+    p.set_defaults(func=cmd_resumo)
+
+    p = sub.add_parser("buscar", help="procura jobs pelo nome ou pasta")
+    p.add_argument("termo")
+    p.set_defaults(func=cmd_buscar)
+
+    p = sub.add_parser("historico", help="mudanças de status de um job")
+    p.add_argument("termo")
+    p.set_defaults(func=cmd_historico)
+
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        print(f"❌ Catálogo não encontrado: {args.db}")
+        return
+    db = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    try:
+        args.func(db, args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""Renomeação em massa com regras plugáveis.
+
+Fluxo: percorre a pasta com os.scandir (opcionalmente recursivo), aplica as
+regras a cada nome e monta o plano completo antes de tocar em qualquer
+arquivo. O plano detecta colisões (dois arquivos indo para o mesmo nome ou
+destino já ocupado) e encadeamentos/ciclos (a -> b enquanto b -> a), que
+são resolvidos passando por um nome temporário. As renomeações são feitas
+em paralelo e cada uma é registrada num diário (JSON lines) que permite
+desfazer tudo com --desfazer.
+
+Exemplos:
+    python renomear.py N:\\CEG_RES\\mapas --regra normalizar -r --dry-run
+    python renomear.py "C:\\...\\Plantas" --regra superscrito --regra urb
+    python renomear.py --desfazer renomear_20260101_120000.jsonl
+"""
+import os
+import re
+import json
+import uuid
+import argparse
+import threading
+import unicodedata
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+
+# ---------------------------------------------------------------------------
+# Regras: recebem o nome do arquivo e devolvem o novo nome (ou o mesmo)
+# ---------------------------------------------------------------------------
+
+_NAO_PERMITIDO = re.compile(r'[^A-Za-z0-9._-]')
+_UNDERSCORES = re.compile(r'_+')
+
+
+def regra_normalizar(nome):
+    """Remove acentos, troca caracteres especiais por _ e junta _ repetidos."""
+    if nome.isascii():
+        sem_acento = nome
+    else:
+        sem_acento = unicodedata.normalize('NFD', nome).encode('ascii', 'ignore').decode('utf-8')
+    return _UNDERSCORES.sub('_', _NAO_PERMITIDO.sub('_', sem_acento))
+
+
+_SEM_SUPERSCRITO = str.maketrans({'²': None})
+
+
+def regra_superscrito(nome):
+    """Remove o caractere superscrito '²'."""
+    return nome.translate(_SEM_SUPERSCRITO)
+
+
+_URB = re.compile(r"\d+\.LD9_URB\s*(.*)\.jpe?g", re.IGNORECASE)
+_URB_ABREVIACOES = re.compile(
+    r"Planta humanizada do apartamento|Planta humanizada do pavimento|Planta humanizada"
+)
+
+
+def _formatar_campo_urb(campo):
+    campo = campo.strip().translate(_SEM_SUPERSCRITO)
+    # Abreviações personalizadas: 'PH_' garante underscore após PH
+    campo = _URB_ABREVIACOES.sub("PH_", campo)
+    # ' - ' vira underscore e os espaços são removidos
+    campo = campo.replace(" - ", "_").replace(" ", "")
+    return _UNDERSCORES.sub("_", campo).strip("_")
+
+
+def regra_urb(nome):
+    """XX.LD9_URB <campo>.jpg -> URB-IMG-F01-IMG-<campo>-XXX.jpg"""
+    match = _URB.search(nome)
+    if not match:
+        return nome
+    return f"URB-IMG-F01-IMG-{_formatar_campo_urb(match.group(1))}-XXX.jpg"
+
+
+REGRAS = {
+    "normalizar": regra_normalizar,
+    "superscrito": regra_superscrito,
+    "urb": regra_urb,
+}
+
+
+def aplicar_regras(regras, nome):
+    for regra in regras:
+        nome = regra(nome)
+    return nome
+
+
+# ---------------------------------------------------------------------------
+# Planejamento
+# ---------------------------------------------------------------------------
+
+def listar_arquivos(pasta, recursivo=False, extensoes=None):
+    """Arquivos de pasta (e subpastas, se recursivo) via os.scandir."""
+    pendentes = [pasta]
+    while pendentes:
+        atual = pendentes.pop()
+        try:
+            with os.scandir(atual) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursivo and not entry.name.startswith("."):
+                            pendentes.append(entry.path)
+                    elif entry.is_file():
+                        if extensoes and not entry.name.lower().endswith(extensoes):
+                            continue
+                        yield entry.path
+        except OSError as e:
+            print(f"❌ Erro ao listar {atual}: {e}")
+
+
+def _chave(caminho):
+    # compara caminhos como o Windows (sem diferenciar maiúsculas)
+    return os.path.normcase(caminho)
+
+
+def planejar(pasta, regras, recursivo=False, extensoes=None):
+    """Monta o plano: (renomeações [(origem, destino)], conflitos [(origem, destino, motivo)]).
+
+    Uma renomeação cujo destino é a origem de outra é mantida no plano (a
+    execução libera o nome antes); destinos ocupados por arquivos que não
+    vão mudar, ou pedidos por duas origens, viram conflito.
+    """
+    existentes = {}
+    propostas = []
+    for caminho in listar_arquivos(pasta, recursivo, extensoes):
+        existentes[_chave(caminho)] = caminho
+        nome = os.path.basename(caminho)
+        novo = aplicar_regras(regras, nome)
+        if novo and novo != nome:
+            propostas.append((caminho, os.path.join(os.path.dirname(caminho), novo)))
+
+    origens = {_chave(origem) for origem, _ in propostas}
+    por_destino = {}
+    for origem, destino in propostas:
+        por_destino.setdefault(_chave(destino), []).append((origem, destino))
+
+    renomeacoes = []
+    conflitos = []
+    for chave, itens in por_destino.items():
+        if len(itens) > 1:
+            conflitos += [(o, d, f"{len(itens)} arquivos iriam para o mesmo nome") for o, d in itens]
+            continue
+        origem, destino = itens[0]
+        mesmo_arquivo = _chave(origem) == chave  # só muda maiúsculas/minúsculas
+        if chave in existentes and chave not in origens and not mesmo_arquivo:
+            conflitos.append((origem, destino, "destino já existe"))
+        elif chave not in existentes and os.path.lexists(destino) and not mesmo_arquivo:
+            # arquivo fora do filtro de extensões com o mesmo nome
+            conflitos.append((origem, destino, "destino já existe"))
+        else:
+            renomeacoes.append((origem, destino))
+
+    # Uma origem em conflito continua ocupando seu nome: quem dependia dele também conflita
+    while True:
+        bloqueadas = {_chave(o) for o, _, _ in conflitos}
+        presas = [(o, d) for o, d in renomeacoes if _chave(d) in bloqueadas and _chave(o) != _chave(d)]
+        if not presas:
+            break
+        for o, d in presas:
+            renomeacoes.remove((o, d))
+            conflitos.append((o, d, "destino ocupado por um arquivo em conflito"))
+
+    renomeacoes.sort()
+    return renomeacoes, conflitos
+
+
+# ---------------------------------------------------------------------------
+# Execução e diário
+# ---------------------------------------------------------------------------
+
+class Diario:
+    """Diário de renomeações (uma linha JSON por rename concluído)."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._arquivo = open(caminho, "a", encoding="utf-8")
+
+    def registrar(self, origem, destino):
+        linha = json.dumps({"de": origem, "para": destino}, ensure_ascii=False)
+        with self._lock:
+            self._arquivo.write(linha + "\n")
+            self._arquivo.flush()
+
+    def fechar(self):
+        self._arquivo.close()
+
+
+def _renomear_um(origem, destino, diario):
+    try:
+        os.rename(origem, destino)
+    except OSError as e:
+        print(f"❌ Erro ao renomear {origem}: {e}")
+        return False
+    if diario:
+        diario.registrar(origem, destino)
+    return True
+
+
+def executar(renomeacoes, diario=None, workers=8):
+    """Executa o plano em paralelo; devolve quantos arquivos chegaram ao nome final.
+
+    Renomeações cujo destino é a origem de outra (cadeias e ciclos) passam
+    antes por um nome temporário: na primeira fase todas as envolvidas saem
+    do caminho, na segunda vão para o nome final.
+    """
+    origens = {_chave(o) for o, _ in renomeacoes}
+    diretas = []
+    encadeadas = []
+    for origem, destino in renomeacoes:
+        if _chave(destino) in origens and _chave(destino) != _chave(origem):
+            encadeadas.append((origem, destino))
+        else:
+            diretas.append((origem, destino))
+    # quem libera o nome para uma encadeada também precisa sair antes
+    liberar = {_chave(d) for _, d in encadeadas}
+    encadeadas += [(o, d) for o, d in diretas if _chave(o) in liberar]
+    diretas = [(o, d) for o, d in diretas if _chave(o) not in liberar]
+
+    ok = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        ok += sum(executor.map(lambda r: _renomear_um(r[0], r[1], diario), diretas))
+
+        temporarios = [
+            (o, os.path.join(os.path.dirname(o), f".renomear_{uuid.uuid4().hex}.tmp"), d)
+            for o, d in encadeadas
+        ]
+        movidos = list(executor.map(lambda t: _renomear_um(t[0], t[1], diario), temporarios))
+        segunda = [(tmp, d) for (_, tmp, d), movido in zip(temporarios, movidos) if movido]
+        ok += sum(executor.map(lambda r: _renomear_um(r[0], r[1], diario), segunda))
+    return ok
+
+
+def desfazer(caminho_diario):
+    """Desfaz as renomeações do diário, da última para a primeira (em série,
+    para que cadeias e nomes temporários voltem na ordem certa)."""
+    with open(caminho_diario, "r", encoding="utf-8") as f:
+        passos = [json.loads(linha) for linha in f if linha.strip()]
+    desfeitos = 0
+    for passo in reversed(passos):
+        if _renomear_um(passo["para"], passo["de"], None):
+            desfeitos += 1
+    print(f"↩ {desfeitos} de {len(passos)} renomeações desfeitas")
+    return desfeitos
+
+
+def renomear(pasta, regras, recursivo=False, extensoes=None, dry_run=False, workers=8, diario=None):
+    """Planeja e (fora do dry-run) executa as renomeações de pasta com as regras dadas."""
+    if not os.path.isdir(pasta):
+        print(f"Pasta não encontrada: {pasta}")
+        return 0
+    renomeacoes, conflitos = planejar(pasta, regras, recursivo, extensoes)
+
+    for origem, destino in renomeacoes:
+        print(f"{os.path.relpath(origem, pasta)} -> {os.path.basename(destino)}")
+    for origem, destino, motivo in conflitos:
+        print(f"⚠ Conflito ({motivo}): {os.path.relpath(origem, pasta)} -> {os.path.basename(destino)}")
+    print(f"\nResumo: {len(renomeacoes)} alteração(ões), {len(conflitos)} conflito(s).")
+
+    if dry_run or not renomeacoes:
+        if dry_run:
+            print("Dry-run: nenhum arquivo foi renomeado.")
+        return 0
+
+    caminho_diario = diario or f"renomear_{datetime.now():%Y%m%d_%H%M%S}.jsonl"
+    registro = Diario(caminho_diario)
+    try:
+        ok = executar(renomeacoes, registro, workers)
+    finally:
+        registro.fechar()
+    print(f"\n✅ {ok} arquivo(s) renomeado(s). Para desfazer: python renomear.py --desfazer {caminho_diario}")
+    if conflitos:
+        print("Observe que alguns arquivos não foram renomeados devido a conflitos. Revise manualmente.")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Renomeação em massa com regras")
+    parser.add_argument("pasta", nargs="?")
+    parser.add_argument("--regra", action="append", choices=sorted(REGRAS),
+                        help="regra a aplicar (pode repetir; aplicadas na ordem)")
+    parser.add_argument("-r", "--recursivo", action="store_true", help="inclui subpastas")
+    parser.add_argument("--extensoes", help="só arquivos com estas extensões, ex.: .jpg,.jpeg")
+    parser.add_argument("--dry-run", action="store_true", help="só mostra o plano")
+    parser.add_argument("--workers", type=int, default=8, help="renomeações simultâneas")
+    parser.add_argument("--diario", help="arquivo do diário (padrão: renomear_<data>.jsonl)")
+    parser.add_argument("--desfazer", metavar="DIARIO", help="desfaz as renomeações registradas no diário")
+    args = parser.parse_args()
+
+    if args.desfazer:
+        desfazer(args.desfazer)
+    elif not args.pasta or not args.regra:
+        parser.error("informe a pasta e pelo menos uma --regra")
+    else:
+        extensoes = tuple(e.strip().lower() for e in args.extensoes.split(",")) if args.extensoes else None
+        renomear(args.pasta, [REGRAS[r] for r in args.regra], args.recursivo, extensoes,
+                 args.dry_run, args.workers, args.diario)
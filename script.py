@@ -1,77 +1,433 @@
 import os
+import argparse
+import contextlib
+import cProfile
+import functools
+import hashlib
+import json
+import queue
+import sys
+import atexit
+import threading
+import time
 import xml.etree.ElementTree as ET
 import pymysql
+import pymysql.connections
+import pymysql.cursors
 import subprocess
 from datetime import datetime
+import ftplib
 from ftplib import FTP
 import requests
 import logging
+import logging.handlers
 import re
+import bisect
+import sqlite3
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import NamedTuple, Optional
 from dotenv import load_dotenv
 
-# Carrega as variáveis do arquivo .env
-load_dotenv(r"C:\xampp\htdocs\ScriptsFlow\.env")
+try:
+    from PIL import Image
+except ImportError:  # sem Pillow as prévias são enviadas no tamanho original
+    Image = None
 
+# Carrega as variáveis do arquivo .env (ao lado do script, ou o indicado em SCRIPTSFLOW_ENV)
+ENV_FILE = os.getenv("SCRIPTSFLOW_ENV", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+load_dotenv(ENV_FILE)
 
-PARENT_FOLDER = r"C:\Backburner_Job"
+
+PARENT_FOLDER = os.getenv("BACKBURNER_JOB_DIR", r"C:\Backburner_Job")
 EXCLUDE_KEYWORD = "ANIMA"
 
-# Arquivo de log
-LOG_FILE = os.path.join(PARENT_FOLDER, "processamento2.log")
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    encoding="utf-8"
-)
+# Arquivo de log (rotativo: LOG_MAX_BYTES por arquivo, LOG_BACKUPS cópias antigas)
+LOG_FILE = os.getenv("LOG_FILE", os.path.join(PARENT_FOLDER, "processamento2.log"))
+LOG_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+}
+logger = logging.getLogger("scriptsflow")
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Uma linha JSON por mensagem (LOG_JSON=1), para ferramentas de busca em logs."""
+
+    def format(self, record):
+        return json.dumps({
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }, ensure_ascii=False)
+
+
+def setup_logging(level=None):
+    """Liga o log: as mensagens vão para uma fila e uma thread grava arquivo e console.
+
+    Assim log_and_print não espera pelo disco (que pode ser o compartilhamento
+    de rede) nem pelo console. O nível vem de LOG_LEVEL (padrão info); os
+    detalhes de cada job ficam no nível debug.
+    """
+    level = LOG_LEVELS.get((level or os.getenv("LOG_LEVEL", "info")).lower(), logging.INFO)
+    file_handler = logging.handlers.RotatingFileHandler(
+        LOG_FILE,
+        maxBytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+        backupCount=int(os.getenv("LOG_BACKUPS", "5")),
+        encoding="utf-8",
+        delay=True,
+    )
+    if os.getenv("LOG_JSON") == "1":
+        file_handler.setFormatter(JsonLineFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter("%(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console)
+    listener.start()
+    # esvazia a fila antes de o processo terminar
+    atexit.register(listener.stop)
+    logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def set_log_level(level):
+    logger.setLevel(LOG_LEVELS.get(level, logging.INFO))
+
+
+setup_logging()
+
+# Arquivos de estado persistidos entre execuções
+STATE_DIR = os.getenv("SCRIPTSFLOW_STATE_DIR", os.path.join(PARENT_FOLDER, ".scriptsflow"))
+SLACK_USERS_CACHE = os.path.join(STATE_DIR, "slack_users.json")
+JOB_FINGERPRINTS = os.path.join(STATE_DIR, "job_fingerprints.json")
+LOG_SCAN_STATE = os.path.join(STATE_DIR, "log_offsets.json")
+UPLOAD_MANIFEST = os.path.join(STATE_DIR, "upload_manifest.json")
+DERIVATIVES_DIR = os.path.join(STATE_DIR, "derivatives")
+# Último uso de cada chave do cache de derivados (a data dos arquivos não é
+# alterada: ela é comparada pelo manifesto de uploads)
+DERIVATIVES_INDEX = os.path.join(STATE_DIR, "derivatives_index.json")
+# Catálogo local dos jobs (consultado com catalogo.py); JOB_CATALOG=0 desativa
+JOB_CATALOG = os.getenv("JOB_CATALOG", os.path.join(STATE_DIR, "catalog.sqlite3"))
+# Métricas da execução: resumo em JSON e arquivo texto no formato do Prometheus
+# (para o textfile collector do node_exporter)
+METRICS_JSON = os.getenv("METRICS_JSON", os.path.join(STATE_DIR, "run_summary.json"))
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE", os.path.join(STATE_DIR, "scriptsflow.prom"))
+
+
+def load_json_state(path, default):
+    """Lê um arquivo de estado JSON; retorna default se não existir ou estiver corrompido."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json_state(path, data):
+    """Grava o estado de forma atômica (arquivo temporário + os.replace)."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        log_and_print(f"⚠ Falha ao gravar estado em {path}: {e}", "warning")
+
 
 def log_and_print(msg, level="info"):
-    """Função para logar e imprimir no console"""
-    print(msg)
-    if level == "info":
-        logging.info(msg)
-    elif level == "error":
-        logging.error(msg)
-    elif level == "warning":
-        logging.warning(msg)
+    """Função para logar e imprimir no console (sem bloquear: a gravação é feita em segundo plano)"""
+    logger.log(LOG_LEVELS.get(level, logging.INFO), msg)
 
 
-def send_webhook_message(message):
+class RunMetrics:
+    """Contadores e tempos por etapa da execução, seguros entre threads.
+
+    Cada métrica tem um nome e rótulos (ex.: stage="parse_xml"); observe()
+    acumula chamadas e segundos, inc() soma em um contador.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self._timers = {}
+            self._counters = {}
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                self._timers[key] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextlib.contextmanager
+    def timed(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def summary(self):
+        with self._lock:
+            timers = dict(self._timers)
+            counters = dict(self._counters)
+        out = {"started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+               "duration_s": round(time.time() - self.started, 3)}
+        for (name, labels), (count, total, longest) in sorted(timers.items()):
+            group = out.setdefault(name, {})
+            group[",".join(str(v) for _, v in labels) or name] = {
+                "calls": count,
+                "seconds": round(total, 4),
+                "avg_ms": round(1000 * total / count, 3),
+                "max_ms": round(1000 * longest, 3),
+            }
+        for (name, labels), value in sorted(counters.items()):
+            if labels:
+                out.setdefault(name, {})[",".join(str(v) for _, v in labels)] = value
+            else:
+                out[name] = value
+        return out
+
+    def prometheus(self):
+        with self._lock:
+            timers = dict(self._timers)
+            counters = dict(self._counters)
+
+        def fmt(labels):
+            if not labels:
+                return ""
+            parts = []
+            for k, v in labels:
+                v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+                parts.append(f'{k}="{v}"')
+            return "{" + ",".join(parts) + "}"
+
+        lines = []
+        for name in sorted({n for n, _ in timers}):
+            samples = [(labels, value) for (n, labels), value in sorted(timers.items()) if n == name]
+            lines.append(f"# TYPE scriptsflow_{name}_seconds_total counter")
+            lines += [f"scriptsflow_{name}_seconds_total{fmt(labels)} {total:.6f}" for labels, (_, total, _) in samples]
+            lines.append(f"# TYPE scriptsflow_{name}_calls_total counter")
+            lines += [f"scriptsflow_{name}_calls_total{fmt(labels)} {count}" for labels, (count, _, _) in samples]
+        for name in sorted({n for n, _ in counters}):
+            lines.append(f"# TYPE scriptsflow_{name}_total counter")
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"scriptsflow_{name}_total{fmt(labels)} {value}")
+        lines.append("# TYPE scriptsflow_run_started_timestamp_seconds gauge")
+        lines.append(f"scriptsflow_run_started_timestamp_seconds {self.started:.0f}")
+        lines.append("# TYPE scriptsflow_last_update_timestamp_seconds gauge")
+        lines.append(f"scriptsflow_last_update_timestamp_seconds {time.time():.0f}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path=METRICS_JSON, textfile_path=METRICS_TEXTFILE):
+        """Grava o resumo JSON e o arquivo do Prometheus (ambos de forma atômica)."""
+        if json_path:
+            save_json_state(json_path, self.summary())
+        if textfile_path:
+            try:
+                os.makedirs(os.path.dirname(textfile_path) or ".", exist_ok=True)
+                tmp_path = f"{textfile_path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(self.prometheus())
+                os.replace(tmp_path, textfile_path)
+            except OSError as e:
+                log_and_print(f"⚠ Falha ao gravar métricas em {textfile_path}: {e}", "warning")
+
+
+metrics = RunMetrics()
+
+
+def timed_stage(stage):
+    """Decorador: soma o tempo da função na etapa stage das métricas."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with metrics.timed("stage", stage=stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Tempo máximo de espera por uma resposta do Slack (segundos)
+SLACK_API_URL = os.getenv("SLACK_API_URL", "https://slack.com/api").rstrip("/")
+SLACK_TIMEOUT = float(os.getenv("SLACK_TIMEOUT", "10"))
+SLACK_MAX_ATTEMPTS = 3
+
+_slack_sessions = threading.local()
+# Pausa global pedida pelo Slack (Retry-After), respeitada por todas as threads
+_slack_pause_until = 0.0
+
+
+def _slack_session():
+    """Sessão HTTP com keep-alive, uma por thread (requests.Session não é thread-safe)."""
+    session = getattr(_slack_sessions, "session", None)
+    if session is None:
+        session = requests.Session()
+        _slack_sessions.session = session
+    return session
+
+
+def _slack_request(method, url, **kwargs):
+    """Faz a chamada ao Slack com timeout, respeitando 429/Retry-After e repetindo falhas de rede."""
+    global _slack_pause_until
+    for attempt in range(1, SLACK_MAX_ATTEMPTS + 1):
+        wait = _slack_pause_until - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        endpoint = url[len(SLACK_API_URL) + 1:] if url.startswith(SLACK_API_URL + "/") else "webhook"
+        start = time.perf_counter()
+        try:
+            response = _slack_session().request(method, url, timeout=SLACK_TIMEOUT, **kwargs)
+        except requests.RequestException:
+            metrics.observe("slack", time.perf_counter() - start, endpoint=endpoint, status="erro")
+            if attempt == SLACK_MAX_ATTEMPTS:
+                raise
+            time.sleep(attempt)
+            continue
+        metrics.observe("slack", time.perf_counter() - start, endpoint=endpoint, status=response.status_code)
+        if response.status_code == 429 and attempt < SLACK_MAX_ATTEMPTS:
+            retry_after = float(response.headers.get("Retry-After", "1"))
+            _slack_pause_until = max(_slack_pause_until, time.time() + retry_after)
+            dispatcher = _dispatcher
+            if dispatcher is not None:
+                dispatcher.count("rate_limited")
+            log_and_print(f"⏳ Slack limitou as chamadas (429), aguardando {retry_after:g}s", "warning")
+            continue
+        return response
+    return response
+
+
+def _deliver_webhook(message):
     slack_webhook_url = os.getenv("SLACK_WEBHOOK_URL")
     payload = {"text": message}
     try:
-        response = requests.post(slack_webhook_url, json=payload)
+        response = _slack_request("POST", slack_webhook_url, json=payload)
         if response.status_code == 200:
             log_and_print("✅ Mensagem enviada para o canal de renders!")
-        else:
-            log_and_print(f"❌ Erro ao enviar para o canal de renders: {response.text}")
+            return True
+        log_and_print(f"❌ Erro ao enviar para o canal de renders: {response.text}")
     except Exception as e:
         log_and_print(f"❌ Exceção ao enviar webhook: {e}")
+    return False
 
 
-def get_user_id_by_name(user_name):
+def send_webhook_message(message):
+    """Envia para o canal de renders (pela fila do dispatcher, se estiver ativo)."""
+    dispatcher = _dispatcher
+    if dispatcher is not None:
+        dispatcher.submit(_deliver_webhook, message)
+    else:
+        _deliver_webhook(message)
+
+
+def _normalize_slack_name(name):
+    return " ".join(str(name).split()).casefold()
+
+
+_slack_users = None
+_slack_users_from_disk = False
+_slack_users_lock = threading.Lock()
+
+
+def _fetch_slack_users():
+    """Baixa o diretório completo seguindo os cursores de paginação do users.list."""
     flow_token = os.getenv("FLOW_TOKEN")
-    url = "https://slack.com/api/users.list"
+    url = f"{SLACK_API_URL}/users.list"
     headers = {"Authorization": f"Bearer {flow_token}"}
-    try:
-        response = requests.get(url, headers=headers)
+    users = {}
+    cursor = None
+    while True:
+        params = {"limit": 200}
+        if cursor:
+            params["cursor"] = cursor
+        response = _slack_request("GET", url, headers=headers, params=params)
         data = response.json()
         if not data.get("ok"):
             log_and_print(f"❌ Erro na API users.list: {data.get('error')}")
             return None
         for member in data.get("members", []):
-            if "real_name" in member and member["real_name"].lower() == user_name.lower():
-                return member["id"]
-        log_and_print(f"❌ Usuário {user_name} não encontrado no Slack.")
-        return None
+            if member.get("real_name"):
+                users.setdefault(_normalize_slack_name(member["real_name"]), member["id"])
+        cursor = (data.get("response_metadata") or {}).get("next_cursor")
+        if not cursor:
+            break
+    log_and_print(f"👥 Diretório do Slack carregado: {len(users)} usuários")
+    return users
+
+
+def load_slack_user_directory(force_refresh=False):
+    """Retorna o dicionário real_name normalizado -> user id (um download por execução).
+
+    Se SLACK_USERS_CACHE_TTL (segundos) for maior que zero, uma cópia é mantida
+    em disco e reaproveitada enquanto não expirar.
+    """
+    global _slack_users, _slack_users_from_disk
+    with _slack_users_lock:
+        if _slack_users is not None and not force_refresh:
+            return _slack_users
+
+        ttl = int(os.getenv("SLACK_USERS_CACHE_TTL", "3600"))
+        if ttl > 0 and not force_refresh:
+            cached = load_json_state(SLACK_USERS_CACHE, None)
+            if cached and time.time() - cached.get("fetched_at", 0) < ttl:
+                _slack_users = cached.get("users", {})
+                _slack_users_from_disk = True
+                return _slack_users
+
+        users = _fetch_slack_users()
+        if users is None:
+            return None
+        _slack_users = users
+        _slack_users_from_disk = False
+        if ttl > 0:
+            save_json_state(SLACK_USERS_CACHE, {"fetched_at": time.time(), "users": users})
+        return _slack_users
+
+
+def get_user_id_by_name(user_name):
+    try:
+        users = load_slack_user_directory()
+        if users is None:
+            return None
+        key = _normalize_slack_name(user_name)
+        user_id = users.get(key)
+        if user_id is None and _slack_users_from_disk:
+            # cópia em disco pode estar desatualizada (usuário novo): recarrega uma vez
+            users = load_slack_user_directory(force_refresh=True) or {}
+            user_id = users.get(key)
+        if user_id is None:
+            log_and_print(f"❌ Usuário {user_name} não encontrado no Slack.")
+        return user_id
     except Exception as e:
         log_and_print(f"❌ Exceção ao buscar usuário {user_name}: {e}")
         return None
 
 
-def send_dm_to_user(user_id, message):
+def _deliver_dm(user_id, message):
     flow_token = os.getenv("FLOW_TOKEN")
-    url = "https://slack.com/api/chat.postMessage"
+    url = f"{SLACK_API_URL}/chat.postMessage"
     headers = {
         "Authorization": f"Bearer {flow_token}",
         "Content-Type": "application/json"
@@ -81,28 +437,295 @@ def send_dm_to_user(user_id, message):
         "text": message
     }
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        response = _slack_request("POST", url, json=payload, headers=headers)
         data = response.json()
         if response.status_code == 200 and data.get("ok"):
             log_and_print(f"✅ DM enviada para {user_id} com sucesso!")
-        else:
-            log_and_print(f"❌ Erro ao enviar DM para {user_id}: {data.get('error', response.text)}")
+            return True
+        log_and_print(f"❌ Erro ao enviar DM para {user_id}: {data.get('error', response.text)}")
     except Exception as e:
         log_and_print(f"❌ Exceção ao enviar DM para {user_id}: {e}")
+    return False
+
+
+def _deliver_dm_by_name(slack_name, message):
+    user_id = get_user_id_by_name(slack_name)
+    if not user_id:
+        return False
+    return _deliver_dm(user_id, message)
+
+
+def send_dm_to_user(user_id, message):
+    """Envia DM (pela fila do dispatcher, se estiver ativo)."""
+    dispatcher = _dispatcher
+    if dispatcher is not None:
+        dispatcher.submit(_deliver_dm, user_id, message)
+    else:
+        _deliver_dm(user_id, message)
 
-# Conexão com banco - AGORA LENDO TUDO DO .ENV
-conn = pymysql.connect(
-    host=os.getenv("DB_HOST"),
-    user=os.getenv("DB_USER"),
-    password=os.getenv("DB_PASS"),
-    database=os.getenv("DB_NAME"),
-    charset='utf8mb4'
+
+def send_dm_to_slack_name(slack_name, message):
+    """Procura o usuário pelo nome do Slack e envia a DM; a busca também sai do caminho principal."""
+    dispatcher = _dispatcher
+    if dispatcher is not None:
+        dispatcher.submit(_deliver_dm_by_name, slack_name, message)
+    else:
+        _deliver_dm_by_name(slack_name, message)
+
+
+class NotificationDispatcher:
+    """Entrega as notificações do Slack em segundo plano.
+
+    A varredura só coloca as mensagens na fila; um número limitado de threads
+    faz as chamadas HTTP. drain() espera a fila esvaziar e registra um resumo
+    das entregas.
+    """
+
+    def __init__(self, concurrency=2):
+        self._queue = queue.Queue()
+        self._stats = {"sent": 0, "failed": 0, "rate_limited": 0}
+        self._stats_lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"slack-{i}", daemon=True)
+            for i in range(max(1, concurrency))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def submit(self, deliver, *args):
+        self._queue.put((deliver, args))
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            deliver, args = item
+            try:
+                ok = deliver(*args)
+            except Exception as e:
+                log_and_print(f"❌ Exceção ao entregar notificação: {e}", "error")
+                ok = False
+            self.count("sent" if ok else "failed")
+
+    def drain(self, timeout=None):
+        """Espera as entregas pendentes, encerra as threads e retorna o resumo."""
+        for _ in self._threads:
+            self._queue.put(None)
+        deadline = None if timeout is None else time.time() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0, deadline - time.time()))
+        # o que sobrou na fila (sem contar os sinais de parada) não foi entregue
+        pending = sum(1 for item in list(self._queue.queue) if item is not None)
+        with self._stats_lock:
+            report = dict(self._stats, pending=pending)
+        log_and_print(
+            f"📨 Notificações: {report['sent']} entregues, {report['failed']} com falha, "
+            f"{report['rate_limited']} limitadas pelo Slack (429), {report['pending']} pendentes"
+        )
+        return report
+
+
+_dispatcher = None
+
+
+def start_notification_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = NotificationDispatcher(concurrency=int(os.getenv("SLACK_CONCURRENCY", "2")))
+    return _dispatcher
+
+
+def stop_notification_dispatcher(timeout=None):
+    global _dispatcher
+    dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher is None:
+        return None
+    return dispatcher.drain(timeout)
+
+_SQL_CATEGORY = re.compile(
+    r"^\s*(?:(update)\s+`?(\w+)|(select|insert|delete|replace)\b.*?\b(?:from|into)\s+`?(\w+)|(\w+))",
+    re.IGNORECASE | re.DOTALL,
 )
 
 
-log_and_print(f"Usuário: {os.getlogin()}")
-log_and_print(f"Diretório atual: {os.getcwd()}")
-log_and_print(f".env carregado: {os.getenv('DB_HOST')}")
+def _sql_category(query):
+    """Categoria da instrução para as métricas: verbo e tabela, ex. "select render_alta"."""
+    m = _SQL_CATEGORY.match(query if isinstance(query, str) else query.decode("utf-8", "ignore"))
+    if not m:
+        return "outro"
+    if m.group(1):
+        return f"update {m.group(2)}"
+    if m.group(3):
+        return f"{m.group(3).lower()} {m.group(4)}"
+    return m.group(5).lower()
+
+
+# Códigos do MySQL para conexão perdida (server has gone away, lost connection,
+# desconectado por inatividade)
+_DB_CONNECTION_LOST = {2006, 2013, 2055, 4031}
+
+
+def _db_connection_lost(error):
+    if isinstance(error, pymysql.err.InterfaceError):
+        return True
+    return bool(error.args) and error.args[0] in _DB_CONNECTION_LOST
+
+
+class InstrumentedCursor(pymysql.cursors.Cursor):
+    """Cursor que registra quantidade e tempo de cada ida ao banco por categoria.
+
+    Se a conexão caiu (ex.: wait_timeout do servidor) e não há gravações
+    pendentes na transação, reconecta e repete a instrução uma vez.
+    """
+
+    def execute(self, query, args=None):
+        category = _sql_category(query)
+        start = time.perf_counter()
+        try:
+            try:
+                result = super().execute(query, args)
+            except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+                connection = self.connection
+                if not _db_connection_lost(e) or connection is None or getattr(connection, "dirty", False):
+                    raise
+                log_and_print(f"🔌 Conexão com o banco perdida ({e}), reconectando", "warning")
+                connection.ping(reconnect=True)
+                metrics.inc("db_reconnects")
+                result = super().execute(query, args)
+        finally:
+            metrics.observe("db", time.perf_counter() - start, category=category)
+        if not category.startswith(("select", "show")):
+            self.connection.dirty = True
+        self.connection.last_used = time.monotonic()
+        return result
+
+
+class ManagedConnection(pymysql.connections.Connection):
+    """Conexão que sabe se tem gravações ainda não confirmadas (dirty)."""
+
+    dirty = False
+    last_used = 0.0
+
+    def commit(self):
+        super().commit()
+        self.dirty = False
+
+    def rollback(self):
+        self.dirty = False
+        super().rollback()
+
+
+def open_db_connection():
+    """Abre uma conexão nova com o banco - AGORA LENDO TUDO DO .ENV"""
+    connection = ManagedConnection(
+        host=os.getenv("DB_HOST"),
+        port=int(os.getenv("DB_PORT", "3306")),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASS"),
+        database=os.getenv("DB_NAME"),
+        charset='utf8mb4',
+        cursorclass=InstrumentedCursor,
+    )
+    connection.last_used = time.monotonic()
+    return connection
+
+
+class DatabaseManager:
+    """Conexões com o MySQL abertas sob demanda.
+
+    connection() devolve a conexão principal (aberta no primeiro uso).
+    acquire()/release() emprestam conexões de um pool para os workers.
+    Conexões paradas há mais de DB_PING_AFTER segundos passam por um ping
+    (que reconecta se o servidor tiver fechado a conexão) antes de serem
+    entregues.
+    """
+
+    def __init__(self, max_idle=4, ping_after=60.0):
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self._lock = threading.Lock()
+        self._main = None
+        self._idle = []
+
+    def _connect(self):
+        connection = open_db_connection()
+        log_and_print(f"🗄️ Conectado ao banco: {os.getenv('DB_HOST')}", "debug")
+        return connection
+
+    def _ensure_alive(self, connection):
+        if time.monotonic() - connection.last_used > self.ping_after:
+            connection.ping(reconnect=True)
+            connection.last_used = time.monotonic()
+        return connection
+
+    def connection(self):
+        with self._lock:
+            if self._main is None:
+                self._main = self._connect()
+            return self._ensure_alive(self._main)
+
+    def acquire(self):
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            return self._connect()
+        return self._ensure_alive(connection)
+
+    def release(self, connection, broken=False):
+        if not broken:
+            try:
+                if connection.dirty:
+                    connection.rollback()
+            except pymysql.MySQLError:
+                broken = True
+        with self._lock:
+            if not broken and len(self._idle) < self.max_idle:
+                self._idle.append(connection)
+                return
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    @contextlib.contextmanager
+    def pooled(self):
+        """Empresta uma conexão do pool; ela volta ao pool ao final."""
+        connection = self.acquire()
+        try:
+            yield connection
+        except BaseException:
+            self.release(connection, broken=True)
+            raise
+        else:
+            self.release(connection)
+
+    def rollback(self, connection):
+        """Desfaz a transação sem propagar erro (a conexão pode já ter caído)."""
+        try:
+            connection.rollback()
+        except Exception as e:
+            log_and_print(f"⚠ Rollback falhou: {e}", "warning")
+
+    def close(self):
+        with self._lock:
+            connections = self._idle + ([self._main] if self._main else [])
+            self._idle, self._main = [], None
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+
+db = DatabaseManager(
+    max_idle=int(os.getenv("DB_POOL_SIZE", "4")),
+    ping_after=float(os.getenv("DB_PING_AFTER", "60")),
+)
 
 
 def get_prefix(name: str) -> str:
@@ -118,77 +741,743 @@ def get_prefix(name: str) -> str:
     return name
 
 
-def upload_to_ftp(local_path, remote_path, ftp_host, ftp_user, ftp_pass):
-    try:
-        ftp = FTP(ftp_host, timeout=30)
-        ftp.login(ftp_user, ftp_pass)
+class FTPVerifyError(ftplib.Error):
+    """O tamanho no servidor (SIZE) não confere com o arquivo enviado."""
+
+
+class RateLimiter:
+    """Limita a taxa somada (bytes/s) de todas as threads que usam o limitador.
+
+    Cada bloco reserva sua fatia de tempo na agenda compartilhada e a thread
+    dorme até o fim dela; tempo ocioso não vira crédito para rajadas.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def consume(self, nbytes):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._next = max(self._next, now) + nbytes / self.rate
+            delay = self._next - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class FTPSessionPool:
+    """Mantém sessões FTP autenticadas abertas durante toda a execução.
+
+    Cada sessão lembra o diretório de trabalho atual e o pool compartilha um
+    cache dos diretórios remotos que já sabemos existir, para que o
+    percurso cwd/mkd aconteça uma vez por diretório e não uma vez por arquivo.
+
+    Os envios usam blocos de blocksize bytes, respeitam rate_limit (bytes/s
+    somados entre as sessões; 0 desliga) e, com verify, conferem o tamanho no
+    servidor com SIZE ao final. Se a conexão cair no meio de um envio, a nova
+    tentativa continua de onde o servidor parou (REST).
+    """
+
+    def __init__(self, host, user, passwd, max_sessions=1, timeout=30, retries=1, port=21,
+                 blocksize=65536, rate_limit=0, verify=True):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.passwd = passwd
+        self.max_sessions = max(1, int(max_sessions))
+        self.timeout = timeout
+        self.retries = retries
+        self.blocksize = max(1024, int(blocksize))
+        self.limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.verify = verify
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self._known_dirs = set()
+        self._closed = False
+
+    def _connect(self):
+        ftp = FTP(timeout=self.timeout)
+        ftp.connect(self.host, self.port)
+        ftp.login(self.user, self.passwd)
         # usar modo passivo (compatível com NAT/Firewalls)
         ftp.set_pasv(True)
         # opcional: debug level controlável por variável de ambiente
         if os.getenv("FTP_DEBUG") == "1":
             ftp.set_debuglevel(2)
+        try:
+            # diretório inicial após o login; os caminhos remotos são relativos a ele
+            ftp.scriptsflow_home = ftp.pwd()
+        except ftplib.all_errors:
+            ftp.scriptsflow_home = None
+        ftp.scriptsflow_cwd = ""
+        log_and_print(f"🌐 Conectado ao FTP: {self.host}", "debug")
+        return ftp
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Pool FTP já foi fechado")
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.max_sessions:
+                    self._created += 1
+                    break
+                self._cond.wait()
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, ftp, broken=False):
+        with self._cond:
+            if broken or self._closed:
+                self._created -= 1
+            else:
+                self._idle.append(ftp)
+            self._cond.notify()
+        if broken or self._closed:
+            try:
+                ftp.quit()
+            except ftplib.all_errors:
+                try:
+                    ftp.close()
+                except Exception:
+                    pass
 
-        log_and_print(f"🌐 Conectado ao FTP: {ftp_host}")
+    @contextlib.contextmanager
+    def session(self):
+        """Empresta uma sessão do pool; sessões que falharem são descartadas."""
+        ftp = self._acquire()
+        try:
+            yield ftp
+        except BaseException:
+            self._release(ftp, broken=True)
+            raise
+        else:
+            self._release(ftp)
 
-        # Normalizar separadores e extrair diretório remoto + nome do arquivo
-        remote_path = remote_path.replace('\\', '/')
-        remote_dir = os.path.dirname(remote_path)
-        remote_name = os.path.basename(remote_path)
+    def _change_dir(self, ftp, remote_dir):
+        """Posiciona a sessão em remote_dir, criando as partes que faltarem."""
+        parts = [p for p in remote_dir.split('/') if p]
+        key = "/".join(parts)
+        if ftp.scriptsflow_cwd == key:
+            return
+
+        # Voltar ao diretório inicial (os caminhos são relativos ao login)
+        if ftp.scriptsflow_cwd:
+            ftp.cwd(ftp.scriptsflow_home or "/")
+            ftp.scriptsflow_cwd = ""
 
-        # Tentar mudar para diretório remoto; se não existir, criar recursivamente
-        if remote_dir:
-            # alguns servidores preferem que mudemos por partes (cwd(part))
-            parts = [p for p in remote_dir.split('/') if p]
+        if not parts:
+            return
+
+        if key in self._known_dirs:
+            ftp.cwd(key)
+            ftp.scriptsflow_cwd = key
+            return
+
+        if os.getenv("FTP_DIAG") == "1":
             try:
-                log_and_print(f"🔍 FTP pwd antes da criação: {ftp.pwd()}")
+                log_and_print(f"🔍 FTP pwd antes da criação: {ftp.pwd()}", "debug")
                 # listar conteúdo atual (diagnóstico).
                 try:
                     listing = ftp.nlst()
-                    log_and_print(f"🔍 Listagem inicial remota: {listing[:10]}")
-                except Exception:
-                    log_and_print("🔍 Falha ao listar diretório remoto (não crítico)")
-            except Exception:
+                    log_and_print(f"🔍 Listagem inicial remota: {listing[:10]}", "debug")
+                except ftplib.all_errors:
+                    log_and_print("🔍 Falha ao listar diretório remoto (não crítico)", "debug")
+            except ftplib.all_errors:
                 # ftp.pwd() pode falhar em alguns servidores; não bloqueia
                 pass
 
-            for part in parts:
+        # alguns servidores preferem que mudemos por partes (cwd(part))
+        walked = []
+        for part in parts:
+            walked.append(part)
+            try:
+                ftp.cwd(part)
+            except ftplib.error_perm:
+                ftp.mkd(part)
+                log_and_print(f"📁 Diretório criado no FTP: {part}")
+                ftp.cwd(part)
+            # marca a sessão como fora do diretório inicial já na primeira parte
+            ftp.scriptsflow_cwd = "/".join(walked)
+            self._known_dirs.add(ftp.scriptsflow_cwd)
+
+    def _server_size(self, ftp, remote_name):
+        """SIZE do arquivo na sessão atual, ou None se o servidor não informar."""
+        try:
+            ftp.voidcmd("TYPE I")
+            return ftp.size(remote_name)
+        except ftplib.error_perm:
+            return None
+
+    def upload(self, local_path, remote_path):
+        """Envia local_path para remote_path, reconectando (e retomando) em caso de falha."""
+        # Normalizar separadores e extrair diretório remoto + nome do arquivo
+        remote_path = remote_path.replace('\\', '/')
+        remote_dir = os.path.dirname(remote_path)
+        remote_name = os.path.basename(remote_path)
+
+        try:
+            file = open(local_path, "rb")
+            size = os.fstat(file.fileno()).st_size
+        except OSError as e:
+            log_and_print(f"❌ Erro no upload FTP: {e}", "error")
+            return False
+
+        # bytes enviados pelo STOR da tentativa atual (contados bloco a bloco)
+        sent_now = [0]
+
+        def callback(block):
+            sent_now[0] += len(block)
+            if self.limiter:
+                self.limiter.consume(len(block))
+
+        with file:
+            attempt = 0
+            resume = True
+            # até onde o arquivo remoto contém com certeza bytes desta chamada;
+            # 0 quando a tentativa anterior não chegou a enviar dados pelo STOR
+            resume_limit = 0
+            while True:
+                offset = 0
+                sent_now[0] = 0
                 try:
-                    ftp.cwd(part)
-                except Exception:
-                    try:
-                        ftp.mkd(part)
-                        log_and_print(f"📁 Diretório criado no FTP: {part}")
-                        ftp.cwd(part)
-                    except Exception as e:
-                        log_and_print(f"❌ Falha ao garantir diretório remoto '{part}': {e}", "error")
-                        ftp.quit()
+                    with self.session() as ftp:
+                        self._change_dir(ftp, remote_dir)
+                        if resume_limit and resume:
+                            # o que chegou ao servidor na tentativa anterior não é reenviado;
+                            # um arquivo remoto maior (ou de outra versão) nunca é continuado
+                            partial = self._server_size(ftp, remote_name)
+                            if partial and partial <= resume_limit and partial < size:
+                                offset = partial
+                        # Enviar arquivo usando somente o nome (já estamos no diretório certo)
+                        file.seek(offset)
+                        start = time.perf_counter()
+                        ftp.storbinary(f"STOR {remote_name}", file, blocksize=self.blocksize,
+                                       callback=callback, rest=offset or None)
+                        elapsed = time.perf_counter() - start
+                        if self.verify:
+                            remote = self._server_size(ftp, remote_name)
+                            if remote is not None and remote != size:
+                                raise FTPVerifyError(f"tamanho no servidor {remote} != local {size}")
+                    sent = size - offset
+                    rate = sent / elapsed / 1048576 if elapsed > 0 else 0.0
+                    if offset:
+                        metrics.inc("ftp_resumed")
+                    log_and_print(
+                        f"✅ Upload concluído: {remote_path} ({sent / 1024:.0f} KiB em {elapsed:.2f}s, "
+                        f"{rate:.2f} MiB/s{f', retomado em {offset} bytes' if offset else ''})"
+                    )
+                    return True
+                except (ftplib.all_errors + (RuntimeError,)) as e:
+                    resume_limit = offset + sent_now[0] if sent_now[0] else 0
+                    if isinstance(e, FTPVerifyError):
+                        # tamanho errado depois de um envio completo: reenvia desde o início
+                        resume_limit = 0
+                        metrics.inc("ftp_verify_failed")
+                    if offset and isinstance(e, ftplib.error_perm):
+                        # servidor sem REST: as próximas tentativas enviam o arquivo inteiro
+                        resume = False
+                    if isinstance(e, RuntimeError) or attempt >= self.retries:
+                        log_and_print(f"❌ Erro no upload FTP: {e}", "error")
                         return False
+                    attempt += 1
+                    log_and_print(f"🔁 Falha no FTP ({e}), reconectando (tentativa {attempt}/{self.retries})", "warning")
+
+    def remote_size(self, remote_path):
+        """Tamanho do arquivo remoto pelo comando SIZE, ou None se não existir/não suportado."""
+        remote_path = remote_path.replace('\\', '/')
+        try:
+            with self.session() as ftp:
+                self._change_dir(ftp, os.path.dirname(remote_path))
+                ftp.voidcmd("TYPE I")
+                return ftp.size(os.path.basename(remote_path))
+        except ftplib.all_errors:
+            return None
 
-        # Enviar arquivo usando somente o nome (já estamos no diretório certo)
-        with open(local_path, "rb") as file:
-            ftp.storbinary(f"STOR {remote_name}", file)
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._cond.notify_all()
+        for ftp in idle:
+            try:
+                ftp.quit()
+            except ftplib.all_errors:
+                try:
+                    ftp.close()
+                except Exception:
+                    pass
+
+
+_ftp_pools = {}
+_ftp_pools_lock = threading.Lock()
+# Sessões por host; sem FTP_MAX_SESSIONS, main() usa uma por conexão da fila de prévias
+ftp_max_sessions = int(os.getenv("FTP_MAX_SESSIONS", "1"))
+
+
+def get_ftp_pool(ftp_host, ftp_user, ftp_pass):
+    """Retorna (criando se necessário) o pool de sessões para host/usuário."""
+    key = (ftp_host, ftp_user)
+    with _ftp_pools_lock:
+        pool = _ftp_pools.get(key)
+        if pool is None or pool._closed:
+            pool = FTPSessionPool(
+                ftp_host,
+                ftp_user,
+                ftp_pass,
+                max_sessions=ftp_max_sessions,
+                retries=int(os.getenv("FTP_RETRIES", "1")),
+                port=int(os.getenv("FTP_PORT", "21")),
+                blocksize=int(os.getenv("FTP_BLOCK_SIZE", "65536")),
+                rate_limit=int(os.getenv("FTP_RATE_LIMIT", "0")),
+                verify=os.getenv("FTP_VERIFY_SIZE", "1") != "0",
+            )
+            _ftp_pools[key] = pool
+        return pool
 
-        ftp.quit()
-        log_and_print(f"✅ Upload concluído: {remote_path}")
+
+def close_ftp_pools():
+    """Fecha todas as sessões FTP abertas (chamar ao final da execução)."""
+    with _ftp_pools_lock:
+        pools = list(_ftp_pools.values())
+        _ftp_pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+# Manifesto dos uploads já feitos: "host:caminho remoto" -> tamanho, mtime e hash do arquivo enviado
+_upload_manifest = None
+_upload_manifest_lock = threading.Lock()
+
+
+def _get_upload_manifest():
+    global _upload_manifest
+    with _upload_manifest_lock:
+        if _upload_manifest is None:
+            _upload_manifest = load_json_state(UPLOAD_MANIFEST, {})
+        return _upload_manifest
+
+
+def save_upload_manifest():
+    if _upload_manifest is not None:
+        with _upload_manifest_lock:
+            manifest = dict(_upload_manifest)
+        save_json_state(UPLOAD_MANIFEST, manifest)
+
+
+def _file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _already_uploaded(pool, manifest_key, local_path, remote_path, st):
+    """True se o arquivo local é igual ao último enviado para remote_path.
+
+    Compara tamanho e mtime com o manifesto. Com UPLOAD_HASH=1, um arquivo com
+    o mesmo tamanho mas mtime diferente é comparado pelo SHA-1 antes de ser
+    reenviado. Com UPLOAD_VERIFY_REMOTE=1, confere também o tamanho no servidor
+    (SIZE).
+    """
+    manifest = _get_upload_manifest()
+    with _upload_manifest_lock:
+        entry = manifest.get(manifest_key)
+    if not entry or entry.get("size") != st.st_size:
+        return False
+    if entry.get("mtime_ns") != st.st_mtime_ns:
+        if os.getenv("UPLOAD_HASH") != "1" or not entry.get("sha1"):
+            return False
+        if _file_sha1(local_path) != entry["sha1"]:
+            return False
+        with _upload_manifest_lock:
+            entry["mtime_ns"] = st.st_mtime_ns
+    if os.getenv("UPLOAD_VERIFY_REMOTE") == "1" and pool.remote_size(remote_path) != st.st_size:
+        log_and_print(f"🔍 Arquivo remoto ausente ou diferente, reenviando: {remote_path}")
+        return False
+    return True
+
+
+def upload_to_ftp(local_path, remote_path, ftp_host, ftp_user, ftp_pass):
+    """Envia o arquivo, a menos que o manifesto mostre que essa versão já está no servidor."""
+    try:
+        pool = get_ftp_pool(ftp_host, ftp_user, ftp_pass)
+        st = os.stat(local_path)
+        remote_key = remote_path.replace('\\', '/')
+        manifest_key = f"{ftp_host}:{remote_key}"
+        if _already_uploaded(pool, manifest_key, local_path, remote_path, st):
+            log_and_print(f"⏭ Sem alterações desde o último upload: {remote_path}", "debug")
+            metrics.inc("ftp_files", result="sem_alteracao")
+            return True
+
+        start = time.perf_counter()
+        if not pool.upload(local_path, remote_path):
+            metrics.inc("ftp_files", result="falha")
+            return False
+        metrics.observe("ftp_upload", time.perf_counter() - start)
+        metrics.inc("ftp_files", result="enviado")
+        metrics.inc("ftp_bytes", st.st_size)
+        entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        if os.getenv("UPLOAD_HASH") == "1":
+            entry["sha1"] = _file_sha1(local_path)
+        manifest = _get_upload_manifest()
+        with _upload_manifest_lock:
+            manifest[manifest_key] = entry
         return True
     except Exception as e:
         log_and_print(f"❌ Erro no upload FTP: {e}", "error")
-        try:
-            ftp.quit()
-        except Exception:
-            pass
+        metrics.inc("ftp_files", result="falha")
         return False
 
 
+# Derivados das prévias: versão para a web e miniatura, em JPEG e opcionalmente WebP.
+# O cache fica em DERIVATIVES_DIR, com o nome baseado na impressão digital do
+# arquivo de origem e nas configurações, então cada JPG só é convertido uma vez.
+PREVIEW_MAX_SIZE = int(os.getenv("PREVIEW_MAX_SIZE", "1920"))
+PREVIEW_QUALITY = int(os.getenv("PREVIEW_QUALITY", "82"))
+THUMB_MAX_SIZE = int(os.getenv("THUMB_MAX_SIZE", "480"))
+THUMB_QUALITY = int(os.getenv("THUMB_QUALITY", "75"))
+PREVIEW_WEBP = os.getenv("PREVIEW_WEBP") == "1"
+
+_derivative_pool = None
+_derivative_pool_lock = threading.Lock()
+
+
+def _derivative_specs():
+    """(tipo, formato, lado maior, qualidade) de cada derivado gerado."""
+    specs = [
+        ("preview", "JPEG", PREVIEW_MAX_SIZE, PREVIEW_QUALITY),
+        ("thumb", "JPEG", THUMB_MAX_SIZE, THUMB_QUALITY),
+    ]
+    if PREVIEW_WEBP:
+        specs += [
+            ("preview_webp", "WEBP", PREVIEW_MAX_SIZE, PREVIEW_QUALITY),
+            ("thumb_webp", "WEBP", THUMB_MAX_SIZE, THUMB_QUALITY),
+        ]
+    return specs
+
+
+def _render_derivatives(src, outputs):
+    """Gera os derivados de src (roda nos processos do pool). outputs: [(destino, formato, lado, qualidade)]."""
+    with Image.open(src) as img:
+        img.load()
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        for dest, fmt, max_side, quality in outputs:
+            out = img.copy()
+            out.thumbnail((max_side, max_side), Image.LANCZOS)
+            tmp = dest + ".tmp"
+            if fmt == "JPEG":
+                out.save(tmp, "JPEG", quality=quality, optimize=True, progressive=True)
+            else:
+                out.save(tmp, fmt, quality=quality, method=4)
+            os.replace(tmp, dest)
+    return src
+
+
+def _get_derivative_pool():
+    global _derivative_pool
+    with _derivative_pool_lock:
+        if _derivative_pool is None:
+            workers = int(os.getenv("PREVIEW_PROCESSES", "0")) or os.cpu_count() or 1
+            _derivative_pool = ProcessPoolExecutor(max_workers=workers)
+        return _derivative_pool
+
+
+def close_derivative_pool():
+    global _derivative_pool
+    with _derivative_pool_lock:
+        pool, _derivative_pool = _derivative_pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+class PendingDerivatives:
+    """Derivados pedidos a submit_preview_derivatives, ainda sendo gerados.
+
+    get(caminho) espera só a conversão daquele arquivo e devolve
+    {tipo: arquivo derivado}, ou None se ela falhou (a prévia vai no original).
+    A espera acontece na thread que chama get, normalmente a do envio.
+    """
+
+    def __init__(self, files, futures):
+        self._files = files
+        self._futures = futures
+
+    def get(self, path, default=None):
+        future = self._futures.pop(path, None)
+        if future is not None:
+            try:
+                with metrics.timed("stage", stage="derivados"):
+                    future.result()
+                log_and_print(f"🖼️ Derivados gerados: {os.path.basename(path)}", "debug")
+            except Exception as e:
+                log_and_print(f"⚠ Falha ao gerar derivados de {path}, enviando o original: {e}", "warning")
+                self._files.pop(path, None)
+        return self._files.get(path, default)
+
+
+_derivative_last_use = {}
+_derivative_use_lock = threading.Lock()
+
+
+def submit_preview_derivatives(paths):
+    """Reaproveita do cache ou manda gerar os derivados de cada JPG em paths, sem esperar.
+
+    Retorna um PendingDerivatives; com o Pillow ausente ou PREVIEW_DERIVATIVES=0
+    retorna {} e tudo é enviado no original.
+    """
+    if Image is None or os.getenv("PREVIEW_DERIVATIVES", "1") == "0" or not paths:
+        return {}
+    specs = _derivative_specs()
+    settings = repr(specs).encode("utf-8")
+    result = {}
+    pending = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        key = hashlib.sha1(
+            f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|".encode("utf-8") + settings
+        ).hexdigest()
+        files = {
+            kind: os.path.join(DERIVATIVES_DIR, f"{key}_{kind}.{'jpg' if fmt == 'JPEG' else 'webp'}")
+            for kind, fmt, _, _ in specs
+        }
+        result[path] = files
+        # uso registrado no índice; prune_derivatives só apaga chaves sem uso recente
+        with _derivative_use_lock:
+            _derivative_last_use[key] = time.time()
+        if not all(os.path.exists(f) for f in files.values()):
+            pending[path] = [(files[kind], fmt, side, quality) for kind, fmt, side, quality in specs]
+
+    futures = {}
+    if pending:
+        os.makedirs(DERIVATIVES_DIR, exist_ok=True)
+        pool = _get_derivative_pool()
+        futures = {path: pool.submit(_render_derivatives, path, outputs) for path, outputs in pending.items()}
+    return PendingDerivatives(result, futures)
+
+
+def build_preview_derivatives(paths):
+    """Como submit_preview_derivatives, mas espera todas as conversões.
+
+    Retorna {caminho: {tipo: arquivo derivado}}; caminhos que falharem ficam de
+    fora e são enviados no original.
+    """
+    derivatives = submit_preview_derivatives(paths)
+    result = {}
+    for path in paths:
+        files = derivatives.get(path)
+        if files:
+            result[path] = files
+    return result
+
+
+# Derivados não usados há este número de dias são apagados (versões antigas de
+# renders refeitos); a limpeza roda no fim da execução e a cada hora no --watch
+DERIVATIVES_MAX_AGE_DAYS = float(os.getenv("DERIVATIVES_MAX_AGE_DAYS", "14"))
+
+
+def prune_derivatives(max_age_days=DERIVATIVES_MAX_AGE_DAYS):
+    """Apaga do cache os derivados não gerados nem reaproveitados há max_age_days dias.
+
+    O último uso de cada chave vem de DERIVATIVES_INDEX (atualizado com os usos
+    desta execução); arquivos sem entrada no índice usam a data de criação.
+    """
+    limit = time.time() - max_age_days * 86400
+    index = load_json_state(DERIVATIVES_INDEX, {})
+    with _derivative_use_lock:
+        index.update(_derivative_last_use)
+    removed = 0
+    live = set()
+    try:
+        with os.scandir(DERIVATIVES_DIR) as it:
+            for entry in it:
+                try:
+                    if not entry.is_file():
+                        continue
+                    key = entry.name.split("_", 1)[0]
+                    if index.get(key, entry.stat().st_mtime) < limit:
+                        os.remove(entry.path)
+                        removed += 1
+                    else:
+                        live.add(key)
+                except OSError:
+                    continue
+    except FileNotFoundError:
+        return 0
+    except OSError as e:
+        log_and_print(f"⚠ Erro ao limpar os derivados: {e}", "warning")
+        return 0
+    save_json_state(DERIVATIVES_INDEX, {key: index[key] for key in live if key in index})
+    if removed:
+        log_and_print(f"🧹 {removed} derivado(s) antigo(s) removido(s) de {DERIVATIVES_DIR}")
+    return removed
+
+
+def upload_preview(local_path, remote_base_path, preview_name, derivatives, ftp_host, ftp_user, ftp_pass):
+    """Envia a prévia com o mesmo nome gravado em previa_jpg/render_previews.
+
+    Com derivados, o nome remoto recebe a versão para a web; a miniatura vai
+    para thumbs/ com o mesmo nome e as versões WebP usam a extensão .webp.
+    """
+    files = derivatives.get(local_path)
+    if not files:
+        return upload_to_ftp(local_path, remote_base_path + preview_name, ftp_host, ftp_user, ftp_pass)
+    stem = os.path.splitext(preview_name)[0]
+    remote_names = {
+        "preview": preview_name,
+        "thumb": "thumbs/" + preview_name,
+        "preview_webp": stem + ".webp",
+        "thumb_webp": "thumbs/" + stem + ".webp",
+    }
+    ok = True
+    for kind, path in files.items():
+        if not upload_to_ftp(path, remote_base_path + remote_names[kind], ftp_host, ftp_user, ftp_pass):
+            ok = False
+    return ok
+
+
+# Envios das prévias em segundo plano: a varredura enfileira e segue para o
+# próximo job; FTP_TRANSFER_CONNECTIONS threads (uma sessão FTP cada) enviam.
+# A fila é limitada para que a varredura espere quando o FTP não acompanha.
+FTP_TRANSFER_CONNECTIONS = int(os.getenv("FTP_TRANSFER_CONNECTIONS", "4"))
+FTP_TRANSFER_QUEUE = int(os.getenv("FTP_TRANSFER_QUEUE", "64"))
+
+
+class PreviewTransferQueue:
+    """Envia as prévias por várias conexões FTP enquanto a varredura continua.
+
+    submit() recebe todos os arquivos de um job e chama on_done(enviados, ok)
+    quando o último terminar, na thread do envio; é ali que o job grava
+    previa_jpg/render_previews, então o banco só registra o que o servidor
+    confirmou. Com connections=0 os envios acontecem na hora, na própria
+    chamada. join() espera a fila esvaziar e devolve as pastas de job com
+    algum envio que falhou.
+    """
+
+    def __init__(self, connections=4, maxsize=64):
+        self._queue = queue.Queue(maxsize=max(1, maxsize))
+        self._failed = set()
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"ftp-{i}", daemon=True)
+            for i in range(max(0, connections))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, job_folder, remote_base_path, items, on_done):
+        """items: [(caminho local, nome da prévia, derivados)] na ordem de registro."""
+        if not items:
+            on_done([], True)
+            return
+        job = {"folder": job_folder, "remaining": len(items), "results": [None] * len(items), "on_done": on_done}
+        for index, (local_path, preview_name, derivatives) in enumerate(items):
+            task = (job, index, local_path, remote_base_path, preview_name, derivatives)
+            if not self._threads:
+                self._run(task)
+                continue
+            try:
+                self._queue.put_nowait(task)
+            except queue.Full:
+                # fila cheia: a varredura espera o FTP (back-pressure)
+                metrics.inc("ftp_queue_full")
+                start = time.perf_counter()
+                self._queue.put(task)
+                metrics.observe("ftp_queue_wait", time.perf_counter() - start)
+
+    def _run(self, task):
+        job, index, local_path, remote_base_path, preview_name, derivatives = task
+        try:
+            ok = upload_preview(local_path, remote_base_path, preview_name, derivatives,
+                                os.getenv("FTP_HOST"), os.getenv("FTP_USER"), os.getenv("FTP_PASS"))
+        except Exception as e:
+            log_and_print(f"❌ Erro no upload FTP: {e}", "error")
+            ok = False
+        with self._lock:
+            job["results"][index] = preview_name if ok else False
+            job["remaining"] -= 1
+            done = job["remaining"] == 0
+            if done and not all(job["results"]):
+                self._failed.add(job["folder"])
+        if done:
+            uploaded = [name for name in job["results"] if name]
+            try:
+                job["on_done"](uploaded, len(uploaded) == len(job["results"]))
+            except Exception as e:
+                log_and_print(f"❌ Erro ao registrar os envios de {job['folder']}: {e}", "error")
+                with self._lock:
+                    self._failed.add(job["folder"])
+
+    def _worker(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+                self._run(task)
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """Espera todos os envios enfileirados; retorna (e esquece) os jobs com falha."""
+        self._queue.join()
+        with self._lock:
+            failed, self._failed = self._failed, set()
+        return failed
+
+    def close(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+
+_transfers = None
+_transfers_lock = threading.Lock()
+
+
+def get_preview_transfers():
+    global _transfers
+    with _transfers_lock:
+        if _transfers is None:
+            _transfers = PreviewTransferQueue(FTP_TRANSFER_CONNECTIONS, FTP_TRANSFER_QUEUE)
+        return _transfers
+
+
+def close_preview_transfers():
+    global _transfers
+    with _transfers_lock:
+        transfers, _transfers = _transfers, None
+    if transfers is not None:
+        transfers.close()
+
+
+@timed_stage("parse_xml")
 def parse_xml(xml_path):
-    log_and_print(f"Lendo XML: {xml_path}")
+    log_and_print(f"Lendo XML: {xml_path}", "debug")
     tree = ET.parse(xml_path)
     root = tree.getroot()
     job_info = root.find("JobInfo")
     job_flags = root.find("JobFlags")
     output = root.find(".//Output/Name")
     if output is not None:
-        log_and_print("Caminho EXR encontrado: " + output.text)
+        log_and_print("Caminho EXR encontrado: " + output.text, "debug")
     else:
         log_and_print("⚠ EXR não encontrado no XML", "warning")
     data = {
@@ -201,7 +1490,7 @@ def parse_xml(xml_path):
         "LastUpdated": job_info.find("LastUpdated").text if job_info is not None else None,
         "ExrPath": output.text if output is not None else None
     }
-    log_and_print(f"Dados XML: {data}")
+    log_and_print(f"Dados XML: {data}", "debug")
     return data
 
 
@@ -249,21 +1538,373 @@ def normalize_datetime_for_mysql(s: str):
         return f"{date_part} {time_part}"
     return date_part
 
+# Estado da leitura incremental dos logs: caminho -> offset já lido e erros acumulados
+_log_scan_state = None
+_log_scan_lock = threading.Lock()
+
+
+def _get_log_scan_state():
+    global _log_scan_state
+    with _log_scan_lock:
+        if _log_scan_state is None:
+            _log_scan_state = load_json_state(LOG_SCAN_STATE, {})
+        return _log_scan_state
+
+
+def save_log_scan_state(max_age_days=30):
+    """Grava o estado dos logs, descartando os que não são lidos há max_age_days dias."""
+    if _log_scan_state is None:
+        return
+    limit = time.time() - max_age_days * 86400
+    with _log_scan_lock:
+        state = {path: entry for path, entry in _log_scan_state.items() if entry.get("seen", 0) >= limit}
+    save_json_state(LOG_SCAN_STATE, state)
+
+
+# Linhas de erro do log: "ERR"/"ERROR" como palavra (ERRATA, SERRA etc. não contam).
+# LOG_ERROR_REGEX substitui o padrão.
+_LOG_ERROR = re.compile(os.getenv("LOG_ERROR_REGEX", r"\bERR(?:OR)?\b").encode("utf-8"))
+# Partes que mudam entre repetições do mesmo erro (data/hora, frame, endereços)
+_LOG_NUMBERS = re.compile(r"0x[0-9A-Fa-f]+|\d+")
+LOG_ERROR_TOP = int(os.getenv("LOG_ERROR_TOP", "10"))
+LOG_ERROR_SIGNATURES = int(os.getenv("LOG_ERROR_SIGNATURES", "50"))
+LOG_ERROR_LINE_MAX = 300
+
+
+class ErrorSummary:
+    """Resumo de tamanho fixo das linhas de erro de um log.
+
+    Linhas que só diferem nos números (data/hora, frame...) têm a mesma assinatura e
+    viram uma entrada (quantidade, primeira e última linha). Acima de
+    max_signatures assinaturas distintas, as novas só entram na contagem de
+    "outras", então memória e texto gravado não crescem com o tamanho do log.
+    """
+
+    def __init__(self, max_signatures=LOG_ERROR_SIGNATURES):
+        self.max_signatures = max_signatures
+        self.entries = {}  # assinatura -> [quantidade, primeira linha, última linha]
+        self.other = 0
+        self.total = 0
+
+    @staticmethod
+    def signature(line):
+        return _LOG_NUMBERS.sub("#", line)
+
+    def add(self, line):
+        line = line.strip()[:LOG_ERROR_LINE_MAX]
+        self.total += 1
+        key = self.signature(line)
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry[0] += 1
+            entry[2] = line
+        elif len(self.entries) < self.max_signatures:
+            self.entries[key] = [1, line, line]
+        else:
+            self.other += 1
+
+    def copy(self):
+        clone = ErrorSummary(self.max_signatures)
+        clone.entries = {key: list(entry) for key, entry in self.entries.items()}
+        clone.other = self.other
+        clone.total = self.total
+        return clone
+
+    def to_state(self):
+        return {"entries": self.entries, "other": self.other, "total": self.total}
+
+    @classmethod
+    def from_state(cls, data):
+        summary = cls()
+        if isinstance(data, list):
+            # estado antigo: lista com as linhas de erro
+            for line in data:
+                summary.add(line)
+            return summary
+        summary.entries = {key: list(entry) for key, entry in (data.get("entries") or {}).items()}
+        summary.other = data.get("other", 0)
+        summary.total = data.get("total", 0)
+        return summary
+
+    def render(self, top=LOG_ERROR_TOP):
+        """Texto gravado em render_alta.errors: as top assinaturas mais frequentes."""
+        if not self.total:
+            return ""
+        # mais frequentes primeiro; empate pela ordem em que apareceram
+        ranked = sorted(self.entries.values(), key=lambda e: -e[0])
+        lines = []
+        for count, first, last in ranked[:top]:
+            prefix = f"[{count}x] " if count > 1 else ""
+            lines.append(prefix + first)
+            if count > 1 and last != first:
+                lines.append(f"    última: {last}")
+        hidden = sum(e[0] for e in ranked[top:]) + self.other
+        if hidden:
+            lines.append(f"... mais {hidden} linha(s) de erro de outros tipos")
+        return "\n".join(lines)
+
+
+def _scan_error_lines(f, summary):
+    """Lê f até o fim somando os erros em summary; devolve (posição após a última
+    linha completa, linha de erro parcial final ou None)."""
+    consumed = f.tell()
+    tail_error = None
+    search = _LOG_ERROR.search
+    for raw in f:
+        complete = raw.endswith(b"\n")
+        if search(raw):
+            line = raw.decode("utf-8", errors="ignore")
+            if complete:
+                summary.add(line)
+            else:
+                tail_error = line
+        if complete:
+            consumed += len(raw)
+    return consumed, tail_error
+
+
+def _bytes_before(f, offset, size=64):
+    """Assinatura dos bytes logo antes de offset (detecta arquivo reescrito no lugar)."""
+    start = max(0, offset - size)
+    f.seek(start)
+    return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+
+@timed_stage("check_log")
 def check_log(log_path):
-    log_and_print(f"Lendo log: {log_path}")
-    has_error = False
-    errors = []
-    with open(log_path, "r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            if "ERR" in line:
-                has_error = True
-                errors.append(line.strip())
-    log_and_print(f"Erros encontrados: {len(errors)}")
-    return has_error, "\n".join(errors)
+    """Procura linhas de erro no log, lendo só o que foi acrescentado desde a última execução.
+
+    Guarda por arquivo o offset da última linha completa lida, o inode/tamanho,
+    uma assinatura dos bytes antes do offset e o ErrorSummary acumulado. Se o arquivo
+    foi truncado, trocado (rotação) ou reescrito, lê de novo desde o início. Uma última linha ainda sem quebra de linha é
+    considerada no resultado, mas lida de novo na próxima vez.
+    Retorna (tem erro, resumo dos erros para render_alta.errors).
+    """
+    log_and_print(f"Lendo log: {log_path}", "debug")
+    state = _get_log_scan_state()
+    st = os.stat(log_path)
+    with _log_scan_lock:
+        entry = dict(state.get(log_path) or {})
+
+    with open(log_path, "rb") as f:
+        if entry and (entry.get("ino") != st.st_ino or st.st_size < entry.get("offset", 0)
+                      or _bytes_before(f, entry["offset"]) != entry.get("check")):
+            log_and_print(f"🔄 Log truncado ou substituído, lendo desde o início: {log_path}")
+            entry = {}
+        if not entry:
+            entry = {"offset": 0, "errors": {}}
+
+        summary = ErrorSummary.from_state(entry["errors"])
+        f.seek(entry["offset"])
+        offset, tail_error = _scan_error_lines(f, summary)
+        check = _bytes_before(f, offset)
+    read_bytes = offset - entry["offset"]
+    metrics.inc("log_bytes_read", read_bytes)
+
+    with _log_scan_lock:
+        state[log_path] = {
+            "offset": offset,
+            "ino": st.st_ino,
+            "size": st.st_size,
+            "check": check,
+            "errors": summary.to_state(),
+            "seen": time.time(),
+        }
+
+    if tail_error:
+        summary = summary.copy()
+        summary.add(tail_error)
+    log_and_print(
+        f"Erros encontrados: {summary.total} ({len(summary.entries)} tipos, {read_bytes} bytes novos lidos)", "debug"
+    )
+    return summary.total > 0, summary.render()
+
+def _fold(value):
+    """Aproxima a comparação do MySQL (collation _ci): ignora caixa e acentos."""
+    value = unicodedata.normalize("NFD", value)
+    value = "".join(c for c in value if not unicodedata.combining(c))
+    return value.casefold()
+
+
+def _collation_key(value):
+    """Chave para igualdade: como _fold, ignorando também os espaços finais."""
+    return _fold(value).rstrip(" ")
+
+
+def _like_prefix_regex(pattern):
+    """Converte um padrão LIKE em (parte literal inicial, regex equivalente)."""
+    literal = []
+    regex = []
+    in_literal = True
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\" and i + 1 < len(pattern):
+            i += 1
+            regex.append(re.escape(pattern[i]))
+            if in_literal:
+                literal.append(pattern[i])
+        elif c == "%":
+            regex.append(".*")
+            in_literal = False
+        elif c == "_":
+            regex.append(".")
+            in_literal = False
+        else:
+            regex.append(re.escape(c))
+            if in_literal:
+                literal.append(c)
+        i += 1
+    return "".join(literal), re.compile("".join(regex) + r"\Z", re.DOTALL)
+
+
+class ImageNameIndex:
+    """Índice em memória de imagens_cliente_obra para resolver nomes sem varrer a tabela.
+
+    Guarda um dicionário nome exato -> id e uma lista ordenada dos nomes sem
+    espaços, onde a busca por prefixo (o LIKE do find_imagem_id) vira uma busca
+    binária. Em ambos os casos vence o menor id, como na varredura pela chave
+    primária que o MySQL faz. Linhas novas são carregadas de forma incremental
+    (id maior que o último visto); a cada max_age segundos o índice é recarregado
+    inteiro para refletir renomeações.
+    """
+
+    def __init__(self, max_age=600):
+        self.max_age = max_age
+        self._exact = {}
+        self._stripped_keys = []
+        self._stripped_ids = []
+        self._max_id = 0
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def _add_rows(self, rows):
+        new_entries = []
+        for imagem_id, imagem_nome in rows:
+            if imagem_nome is None:
+                continue
+            key = _collation_key(imagem_nome)
+            if key not in self._exact or imagem_id < self._exact[key]:
+                self._exact[key] = imagem_id
+            new_entries.append((_fold(imagem_nome.replace(" ", "")), imagem_id))
+            self._max_id = max(self._max_id, imagem_id)
+        if new_entries:
+            for key, imagem_id in new_entries:
+                pos = bisect.bisect_right(self._stripped_keys, key)
+                self._stripped_keys.insert(pos, key)
+                self._stripped_ids.insert(pos, imagem_id)
+        return len(new_entries)
+
+    def load(self, cursor):
+        """Carrega a tabela inteira."""
+        with self._lock:
+            cursor.execute("SELECT idimagens_cliente_obra, imagem_nome FROM imagens_cliente_obra")
+            rows = sorted(cursor.fetchall(), key=lambda r: (_fold((r[1] or "").replace(" ", "")), r[0]))
+            self._exact = {}
+            self._stripped_keys = []
+            self._stripped_ids = []
+            self._max_id = 0
+            for imagem_id, imagem_nome in rows:
+                if imagem_nome is None:
+                    continue
+                key = _collation_key(imagem_nome)
+                if key not in self._exact or imagem_id < self._exact[key]:
+                    self._exact[key] = imagem_id
+                self._stripped_keys.append(_fold(imagem_nome.replace(" ", "")))
+                self._stripped_ids.append(imagem_id)
+                self._max_id = max(self._max_id, imagem_id)
+            self._loaded_at = time.time()
+        log_and_print(f"📇 Índice de imagens carregado: {len(self._stripped_ids)} nomes")
+
+    def refresh(self, cursor):
+        """Carrega só as linhas inseridas desde a última leitura."""
+        with self._lock:
+            cursor.execute(
+                "SELECT idimagens_cliente_obra, imagem_nome FROM imagens_cliente_obra WHERE idimagens_cliente_obra > %s",
+                (self._max_id,)
+            )
+            added = self._add_rows(cursor.fetchall())
+        if added:
+            log_and_print(f"📇 Índice de imagens atualizado: +{added} nomes")
+        return added
+
+    def ensure_fresh(self, cursor):
+        if not self._loaded_at or time.time() - self._loaded_at > self.max_age:
+            self.load(cursor)
+
+    def lookup_exact(self, name):
+        return self._exact.get(_collation_key(name))
+
+    def lookup_prefix(self, prefix):
+        """Equivalente a REPLACE(imagem_nome,' ','') LIKE prefix + '%'."""
+        literal, regex = _like_prefix_regex(_fold(prefix) + "%")
+        with self._lock:
+            lo = bisect.bisect_left(self._stripped_keys, literal)
+            hi = bisect.bisect_left(self._stripped_keys, literal + "\U0010ffff", lo)
+            best = None
+            for pos in range(lo, hi):
+                imagem_id = self._stripped_ids[pos]
+                if (best is None or imagem_id < best) and regex.match(self._stripped_keys[pos]):
+                    best = imagem_id
+        return best
+
+    def find(self, cursor, name):
+        """Resolve name como find_imagem_id; numa falha tenta antes as linhas novas."""
+        self.ensure_fresh(cursor)
+        found = self._find(name)
+        if found is None and self.refresh(cursor):
+            found = self._find(name)
+        return found
+
+    def _find(self, name):
+        imagem_id = self.lookup_exact(name)
+        if imagem_id is not None:
+            return "exato", imagem_id
+        prefix = get_prefix(name)
+        if prefix:
+            imagem_id = self.lookup_prefix(prefix)
+            if imagem_id is not None:
+                return "prefixo", imagem_id
+        return None
 
+
+_image_index = None
+_image_index_lock = threading.Lock()
+
+
+def get_image_name_index():
+    """Índice de nomes compartilhado pela execução (IMAGE_INDEX=0 desliga)."""
+    global _image_index
+    if os.getenv("IMAGE_INDEX", "1") == "0":
+        return None
+    with _image_index_lock:
+        if _image_index is None:
+            _image_index = ImageNameIndex(max_age=int(os.getenv("IMAGE_INDEX_MAX_AGE", "600")))
+        return _image_index
+
+
+@timed_stage("find_imagem_id")
 def find_imagem_id(cursor, name):
-    log_and_print(f"Buscando imagem no banco: {name}")
+    log_and_print(f"Buscando imagem no banco: {name}", "debug")
+
+    index = get_image_name_index()
+    if index is not None:
+        found = index.find(cursor, name)
+        if found:
+            how, imagem_id = found
+            if how == "exato":
+                log_and_print(f"Imagem encontrada pelo nome exato: {imagem_id}", "debug")
+            else:
+                log_and_print(f"Imagem encontrada pelo prefixo: {imagem_id}", "debug")
+            return imagem_id
+        log_and_print("Imagem não encontrada", "warning")
+        return None
 
+    return _find_imagem_id_sql(cursor, name)
+
+
+def _find_imagem_id_sql(cursor, name):
+    """Busca direto no banco (usada quando o índice em memória está desligado)."""
     # 1. Busca exata
     cursor.execute(
         "SELECT idimagens_cliente_obra FROM imagens_cliente_obra WHERE imagem_nome=%s",
@@ -271,7 +1912,7 @@ def find_imagem_id(cursor, name):
     )
     result = cursor.fetchone()
     if result:
-        log_and_print(f"Imagem encontrada pelo nome exato: {result[0]}")
+        log_and_print(f"Imagem encontrada pelo nome exato: {result[0]}", "debug")
         return result[0]
 
     # 2. Busca pelo prefixo normalizado
@@ -283,55 +1924,695 @@ def find_imagem_id(cursor, name):
         )
         result = cursor.fetchone()
         if result:
-            log_and_print(f"Imagem encontrada pelo prefixo: {result[0]}")
+            log_and_print(f"Imagem encontrada pelo prefixo: {result[0]}", "debug")
             return result[0]
 
     log_and_print("Imagem não encontrada", "warning")
     return None
 
 
-def find_responsavel_id(cursor, imagem_id):
-    log_and_print(f"Buscando imagem no banco: {imagem_id}")
-    cursor.execute(
-        "SELECT colaborador_id, funcao_id FROM funcao_imagem WHERE funcao_id in (4, 6) AND imagem_id = %s ORDER BY funcao_id DESC LIMIT 1",
-        (imagem_id,)
-    )
-    result = cursor.fetchone()
-    if result:
-        log_and_print(f"Colaborador encontrado: {result[0]} (função {result[1]})")
-        return result  # retorna (colaborador_id, funcao_id)
-    log_and_print("Imagem não encontrada", "warning")
-    return None, None
+# Tamanho máximo das listas IN (...) nas consultas em lote
+SQL_IN_CHUNK = 500
 
-def find_status_id(cursor, imagem_id):
-    log_and_print(f"Buscando status atual no banco: {imagem_id}")
-    cursor.execute(
-        "SELECT status_id FROM imagens_cliente_obra WHERE idimagens_cliente_obra = %s",
-        (imagem_id,)
+
+def _chunks(items, size=SQL_IN_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+@timed_stage("contexto")
+def load_image_contexts(cursor, imagem_ids):
+    """Carrega, em poucas consultas, os dados de cada imagem usados no processamento.
+
+    Retorna {imagem_id: contexto} com nome, status_id e obra_id da imagem, o
+    responsável pelo render (função 4 ou 6, a maior), o responsável da
+    pós-produção (função 5) e o último render_alta do status atual
+    (idrender_alta, status, previa_jpg), além dos nomes no Slack do
+    responsável pelo render. ctx["render"] é atualizado pelo
+    worker dono da imagem e pelos callbacks de envio; use ctx["lock"].
+    """
+    contexts = {}
+    for chunk in _chunks(sorted(set(imagem_ids))):
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(f"""
+            SELECT ico.idimagens_cliente_obra, ico.imagem_nome, ico.status_id, ico.obra_id,
+                   ra.idrender_alta, ra.status, ra.previa_jpg
+            FROM imagens_cliente_obra ico
+            LEFT JOIN render_alta ra ON ra.idrender_alta = (
+                SELECT MAX(r2.idrender_alta)
+                FROM render_alta r2
+                WHERE r2.imagem_id = ico.idimagens_cliente_obra AND r2.status_id = ico.status_id
+            )
+            WHERE ico.idimagens_cliente_obra IN ({placeholders})
+        """, chunk)
+        for imagem_id, imagem_nome, status_id, obra_id, render_id, render_status, previa_jpg in cursor.fetchall():
+            contexts[imagem_id] = {
+                "imagem_nome": imagem_nome,
+                "status_id": status_id,
+                "obra_id": obra_id,
+                "resp_id": None,
+                "funcao_id": None,
+                "pos_resp_id": None,
+                "render": (render_id, render_status, previa_jpg) if render_id else None,
+                "slack_names": [],
+                "lock": threading.Lock(),
+            }
+
+        cursor.execute(f"""
+            SELECT imagem_id, colaborador_id, funcao_id
+            FROM funcao_imagem
+            WHERE funcao_id IN (4, 5, 6) AND imagem_id IN ({placeholders})
+            ORDER BY imagem_id, funcao_id DESC
+        """, chunk)
+        for imagem_id, colaborador_id, funcao_id in cursor.fetchall():
+            ctx = contexts.get(imagem_id)
+            if ctx is None:
+                continue
+            if funcao_id == 5:
+                if ctx["pos_resp_id"] is None:
+                    ctx["pos_resp_id"] = colaborador_id
+            elif ctx["funcao_id"] is None:
+                ctx["resp_id"], ctx["funcao_id"] = colaborador_id, funcao_id
+
+    # Nomes no Slack dos responsáveis (para as DMs de notificação)
+    slack_names = {}
+    for chunk in _chunks(sorted({ctx["resp_id"] for ctx in contexts.values() if ctx["resp_id"]})):
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(f"SELECT idcolaborador, nome_slack FROM usuario WHERE idcolaborador IN ({placeholders})", chunk)
+        for colaborador_id, nome_slack in cursor.fetchall():
+            slack_names.setdefault(colaborador_id, []).append(nome_slack)
+    for ctx in contexts.values():
+        ctx["slack_names"] = slack_names.get(ctx["resp_id"], [])
+
+    log_and_print(f"📦 Contexto carregado para {len(contexts)} imagens")
+    return contexts
+
+
+class JobFolder(NamedTuple):
+    """Pasta de job encontrada na descoberta, com os arquivos já classificados."""
+    path: str
+    xml_file: Optional[str]
+    log_file: Optional[str]
+    xml_sig: Optional[list]
+    log_sig: Optional[list]
+
+
+def _entry_signature(entry):
+    """(mtime_ns, tamanho) a partir do stat em cache do DirEntry."""
+    try:
+        st = entry.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def scan_job_folder(job_folder):
+    """Classifica os arquivos de uma pasta de job numa única passada de scandir."""
+    xml_entry = None
+    log_entry = None
+    subdirs = []
+    with os.scandir(job_folder) as it:
+        for entry in it:
+            name = entry.name.lower()
+            if entry.is_dir():
+                subdirs.append(entry.path)
+                continue
+            if name.endswith(".xml"):
+                xml_entry = entry
+            if name.endswith(".txt") or name.endswith(".log"):
+                log_entry = entry
+    job = JobFolder(
+        path=job_folder,
+        xml_file=xml_entry.path if xml_entry else None,
+        log_file=log_entry.path if log_entry else None,
+        xml_sig=_entry_signature(xml_entry) if xml_entry else None,
+        log_sig=_entry_signature(log_entry) if log_entry else None,
     )
-    result = cursor.fetchone()
-    if result:
-        log_and_print(f"Status atual: {result[0]}")
-        return result[0]
-    log_and_print("Imagem não encontrada", "warning")
-    return None
+    return job, subdirs
+
+
+def discover_jobs(parent_folder, max_depth=2, log_skipped=True):
+    """Percorre parent_folder e devolve as pastas de job (as que têm XML).
+
+    A descida para no nível do job: subpastas de um job não são visitadas.
+    Pastas sem XML são examinadas por dentro até max_depth níveis; as do
+    primeiro nível sem subpastas são devolvidas para registrar o aviso de XML
+    ausente.
+    """
+    pending = [(parent_folder, 0)]
+    while pending:
+        folder, depth = pending.pop(0)
+        try:
+            with metrics.timed("stage", stage="descoberta"), os.scandir(folder) as it:
+                children = sorted(
+                    (e.path for e in it if e.is_dir() and not e.name.startswith(".")),
+                    key=str.lower,
+                )
+        except OSError as e:
+            log_and_print(f"❌ Erro ao listar {folder}: {e}", "error")
+            continue
+        for child in children:
+            if EXCLUDE_KEYWORD in os.path.basename(child).upper():
+                if log_skipped:
+                    log_and_print(f"Ignorado (ANIMA): {child}")
+                continue
+            try:
+                with metrics.timed("stage", stage="descoberta"):
+                    job, subdirs = scan_job_folder(child)
+            except OSError as e:
+                log_and_print(f"❌ Erro ao listar {child}: {e}", "error")
+                continue
+            if job.xml_file:
+                yield job
+                continue
+            if not subdirs:
+                if depth == 0:
+                    yield job
+            elif depth + 1 < max_depth:
+                pending.append((child, depth + 1))
+
+
+def _stat_signature(path):
+    """(mtime_ns, tamanho) do caminho, ou None se não existir."""
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+# Letras de unidade dos caminhos de saída (como aparecem no XML do job) -> compartilhamento
+# no servidor de render. OUTPUT_DRIVE_MAP acrescenta ou substitui entradas, por exemplo
+# OUTPUT_DRIVE_MAP=M=\\192.168.0.250\renders2;Z=\\192.168.0.250\outro
+def _load_drive_map():
+    mapping = {
+        "M": r"\\192.168.0.250\renders2",
+        "Y": r"\\192.168.0.250\renders",
+        "N": r"\\192.168.0.250\exchange",
+    }
+    for item in filter(None, os.getenv("OUTPUT_DRIVE_MAP", "").split(";")):
+        drive, _, unc = item.partition("=")
+        if drive.strip() and unc.strip():
+            mapping[drive.strip().rstrip(":").upper()] = unc.strip()
+    return mapping
+
+
+DRIVE_UNC_MAP = _load_drive_map()
+
+
+def resolve_output_dir(exr_path):
+    """Pasta de saída de um EXR, com a letra de unidade trocada pelo caminho UNC.
+
+    Caso não seja um drive conhecido, usa o caminho original.
+    """
+    if not exr_path:
+        return None
+    if len(exr_path) >= 2 and exr_path[1] == ":":
+        unc = DRIVE_UNC_MAP.get(exr_path[0].upper())
+        if unc:
+            exr_path = unc + exr_path[2:]
+    return os.path.dirname(exr_path)
+
+
+class OutputFolderCache:
+    """Cache por execução do stat e da listagem das pastas de saída.
+
+    Vários jobs gravam na mesma pasta do servidor de render; com o cache cada
+    pasta custa um stat e um listdir pelo SMB por execução, não por job.
+    clear() é chamado no início de cada execução (e de cada ciclo do --watch).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signatures = {}
+        self._listings = {}
+
+    def clear(self):
+        with self._lock:
+            self._signatures.clear()
+            self._listings.clear()
+
+    def signature(self, path):
+        """_stat_signature(path), consultando o servidor uma vez por pasta."""
+        if not path:
+            return None
+        with self._lock:
+            if path in self._signatures:
+                return self._signatures[path]
+        signature = _stat_signature(path)
+        metrics.inc("output_folder_fs", op="stat")
+        with self._lock:
+            return self._signatures.setdefault(path, signature)
+
+    def exists(self, path):
+        return self.signature(path) is not None
+
+    def jpgs(self, path):
+        """Nomes dos .jpg da pasta (na ordem do listdir); lista vazia se ela não existir."""
+        if not self.exists(path):
+            return []
+        with self._lock:
+            names = self._listings.get(path)
+        if names is None:
+            try:
+                names = tuple(f for f in os.listdir(path) if f.lower().endswith(".jpg"))
+            except OSError:
+                names = ()
+            metrics.inc("output_folder_fs", op="listdir")
+            with self._lock:
+                names = self._listings.setdefault(path, names)
+        return list(names)
+
+
+output_folders = OutputFolderCache()
+
+
+def _job_unchanged(fingerprints, job_folder, fingerprint):
+    """True se XML, log e pasta de saída estão iguais ao último processamento."""
+    if fingerprints is None:
+        return False
+    prev = fingerprints.get(job_folder)
+    if not prev:
+        return False
+    fingerprint = dict(fingerprint, output=output_folders.signature(prev.get("output_dir")))
+    return prev.get("fingerprint") == fingerprint
+
+
+def _accumulate_p00(p00_rollup, contrib):
+    """Soma a contribuição de um job ao acumulado do P00 da imagem."""
+    roll = p00_rollup.get(contrib["imagem_id"])
+    if not roll:
+        roll = {
+            "image_name_db": contrib["image_name_db"],
+            "resp_id": contrib["resp_id"],
+            "funcao_id": contrib["funcao_id"],
+            "total_jobs": 0,
+            "completed_jobs": 0,
+            "any_error": False,
+            "any_incomplete": False,
+            "all_complete": True
+        }
+        p00_rollup[contrib["imagem_id"]] = roll
+
+    roll["total_jobs"] += 1
+    if contrib["resp_id"] and not roll.get("resp_id"):
+        roll["resp_id"] = contrib["resp_id"]
+
+    if contrib["has_error"]:
+        roll["any_error"] = True
+    if contrib["complete"] == "yes":
+        roll["completed_jobs"] += 1
+    else:
+        roll["all_complete"] = False
+        roll["any_incomplete"] = True
+
+
+def _merge_p00_rollup(dest, src):
+    """Junta o acumulado do P00 de um worker no acumulado geral."""
+    for imagem_id, roll in src.items():
+        cur = dest.get(imagem_id)
+        if cur is None:
+            dest[imagem_id] = dict(roll)
+            continue
+        cur["total_jobs"] += roll["total_jobs"]
+        cur["completed_jobs"] += roll["completed_jobs"]
+        cur["any_error"] = cur["any_error"] or roll["any_error"]
+        cur["any_incomplete"] = cur["any_incomplete"] or roll["any_incomplete"]
+        cur["all_complete"] = cur["all_complete"] and roll["all_complete"]
+        if roll.get("resp_id") and not cur.get("resp_id"):
+            cur["resp_id"] = roll["resp_id"]
+
+
+class RenderWriteBuffer:
+    """Acumula as gravações de um lote de jobs e as aplica com poucas instruções.
+
+    As linhas que dependem do render (pos_producao, render_previews e a
+    previa_jpg de um render já existente) referenciam a chave
+    (imagem_id, status_id); o idrender_alta é resolvido no flush com uma única
+    consulta depois do upsert em lote do render_alta.
+
+    set_previa/add_previews recebem a pasta do job quando são chamados depois
+    do processamento do job (callbacks dos envios); flush() guarda essas pastas
+    em flushed_jobs, para que quem chamou descarte as impressões digitais
+    delas se a gravação falhar.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self.flushed_jobs = set()
+
+    def _reset(self):
+        self.render_rows = []
+        self.previa_updates = []
+        self.pos_rows = []
+        self.preview_rows = []
+        self.notifications = []
+        self.finished_funcoes = []
+        self.late_jobs = set()
+
+    def __len__(self):
+        return (len(self.render_rows) + len(self.previa_updates) + len(self.pos_rows)
+                + len(self.preview_rows) + len(self.notifications) + len(self.finished_funcoes))
+
+    def add_render(self, values):
+        """values na ordem das colunas do INSERT de render_alta."""
+        with self._lock:
+            self.render_rows.append(values)
+
+    def set_previa(self, render_key, render_id, filename, job_folder=None):
+        with self._lock:
+            self.previa_updates.append((render_key, render_id, filename))
+            if job_folder:
+                self.late_jobs.add(job_folder)
+
+    def add_pos_producao(self, render_key, values):
+        """values sem o render_id, na ordem das colunas do INSERT de pos_producao."""
+        with self._lock:
+            self.pos_rows.append((render_key, values))
+
+    def add_previews(self, render_key, filenames, job_folder=None):
+        with self._lock:
+            self.preview_rows.extend((render_key, filename) for filename in filenames)
+            if job_folder:
+                self.late_jobs.add(job_folder)
+
+    def add_notification(self, colaborador_id, mensagem):
+        with self._lock:
+            self.notifications.append((colaborador_id, mensagem))
+
+    def finish_funcao(self, imagem_id, funcao_id):
+        """Marca a função como Finalizado e a imagem com substatus REN."""
+        with self._lock:
+            self.finished_funcoes.append((imagem_id, funcao_id))
+
+    def _resolve_render_ids(self, cursor, keys):
+        render_ids = {}
+        for chunk in _chunks(sorted(keys)):
+            placeholders = ", ".join(["(%s, %s)"] * len(chunk))
+            cursor.execute(f"""
+                SELECT imagem_id, status_id, MAX(idrender_alta)
+                FROM render_alta
+                WHERE (imagem_id, status_id) IN ({placeholders})
+                GROUP BY imagem_id, status_id
+            """, [v for key in chunk for v in key])
+            for imagem_id, status_id, render_id in cursor.fetchall():
+                render_ids[(imagem_id, status_id)] = render_id
+        return render_ids
+
+    @timed_stage("gravacao")
+    def flush(self, cursor):
+        """Aplica tudo que está pendente; retorna {(imagem_id, status_id): idrender_alta}."""
+        with self._lock:
+            pending = (self.render_rows, self.previa_updates, self.pos_rows,
+                       self.preview_rows, self.notifications, self.finished_funcoes)
+            self.flushed_jobs = self.late_jobs
+            self._reset()
+        render_rows, previa_updates, pos_rows, preview_rows, notifications, finished_funcoes = pending
+
+        if render_rows:
+            cursor.executemany("""
+                INSERT INTO render_alta
+                (imagem_id, responsavel_id, status_id, status, data, computer, submitted, last_updated, has_error, errors, job_folder, previa_jpg, numero_bg)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    status=VALUES(status),
+                    previa_jpg=IFNULL(VALUES(previa_jpg), previa_jpg)
+            """, render_rows)
+
+        # 🔹 render_id de cada (imagem_id, status_id) numa única consulta
+        keys = {(row[0], row[2]) for row in render_rows}
+        keys |= {key for key, _ in pos_rows} | {key for key, _ in preview_rows}
+        keys |= {key for key, render_id, _ in previa_updates if not render_id}
+        render_ids = self._resolve_render_ids(cursor, keys) if keys else {}
+
+        # previa_jpg de renders existentes (fluxo "Em aprovação"), depois do upsert para
+        # que renders criados neste flush sejam encontrados; só preenche previa_jpg vazia,
+        # sem sobrescrever a prévia gravada pelo upsert de um job mais novo
+        previas = {}
+        unresolved = []
+        for key, render_id, filename in previa_updates:
+            render_id = render_id or render_ids.get(key)
+            if render_id:
+                previas[render_id] = filename
+            else:
+                unresolved.append(filename)
+        if unresolved:
+            log_and_print(f"⚠ {len(unresolved)} previa_jpg sem render_alta correspondente: {', '.join(unresolved)}",
+                          "warning")
+        for chunk in _chunks(previas.items()):
+            cases = " ".join(["WHEN %s THEN %s"] * len(chunk))
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(
+                f"UPDATE render_alta SET previa_jpg = CASE idrender_alta {cases} END "
+                f"WHERE idrender_alta IN ({placeholders}) AND (previa_jpg IS NULL OR previa_jpg = '')",
+                [v for item in chunk for v in item] + [render_id for render_id, _ in chunk]
+            )
+
+        rows = [(render_ids.get(key),) + tuple(values) for key, values in pos_rows]
+        if rows:
+            cursor.executemany("""
+                INSERT INTO pos_producao
+                (render_id, imagem_id, obra_id, colaborador_id, caminho_pasta, numero_bg, status_id, responsavel_id)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    obra_id = VALUES(obra_id),
+                    colaborador_id = VALUES(colaborador_id),
+                    caminho_pasta = VALUES(caminho_pasta),
+                    numero_bg = VALUES(numero_bg),
+                    status_id = VALUES(status_id),
+                    responsavel_id = VALUES(responsavel_id)
+            """, rows)
+
+        preview_rows = list(dict.fromkeys(preview_rows))
+        rows = [(render_ids[key], filename) for key, filename in preview_rows if render_ids.get(key)]
+        if len(rows) < len(preview_rows):
+            log_and_print(f"⚠ {len(preview_rows) - len(rows)} previews sem render_alta correspondente", "warning")
+        if rows:
+            # Use INSERT ... ON DUPLICATE KEY UPDATE noop para evitar duplicatas.
+            cursor.executemany(
+                "INSERT INTO render_previews (render_id, filename) VALUES (%s, %s) ON DUPLICATE KEY UPDATE filename=filename",
+                rows
+            )
+
+        if notifications:
+            cursor.executemany(
+                "INSERT INTO notificacoes (colaborador_id, mensagem) VALUES (%s, %s)",
+                notifications
+            )
+
+        # Atualizar função e imagem
+        for chunk in _chunks(sorted(set(finished_funcoes))):
+            placeholders = ", ".join(["(%s, %s)"] * len(chunk))
+            cursor.execute(f"""
+                UPDATE funcao_imagem
+                SET status = 'Finalizado', prazo = NOW()
+                WHERE (imagem_id, funcao_id) IN ({placeholders})
+            """, [v for item in chunk for v in item])
+            imagem_ids = sorted({imagem_id for imagem_id, _ in chunk})
+            cursor.execute(f"""
+                UPDATE imagens_cliente_obra
+                SET substatus_id = 5
+                WHERE idimagens_cliente_obra IN ({", ".join(["%s"] * len(imagem_ids))})
+            """, imagem_ids)
+
+        log_and_print(
+            f"💾 Gravação em lote: {len(render_rows)} render_alta, {len(previas)} previa_jpg, "
+            f"{len(pos_rows)} pos_producao, {len(rows)} render_previews, "
+            f"{len(notifications)} notificacoes, {len(set(finished_funcoes))} funções finalizadas"
+        )
+        return render_ids
+
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_folder   TEXT PRIMARY KEY,
+    name         TEXT,
+    description  TEXT,
+    computer     TEXT,
+    active       TEXT,
+    complete     TEXT,
+    submitted    TEXT,
+    last_updated TEXT,
+    exr_path     TEXT,
+    output_dir   TEXT,
+    imagem_id    INTEGER,
+    status       TEXT,
+    has_error    INTEGER NOT NULL DEFAULT 0,
+    errors       TEXT,
+    first_seen   TEXT NOT NULL,
+    processed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, last_updated);
+CREATE INDEX IF NOT EXISTS idx_jobs_computer ON jobs (computer, status);
+CREATE INDEX IF NOT EXISTS idx_jobs_imagem ON jobs (imagem_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_error ON jobs (has_error, last_updated);
+CREATE INDEX IF NOT EXISTS idx_jobs_processed ON jobs (processed_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_name ON jobs (name COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS job_history (
+    id          INTEGER PRIMARY KEY,
+    job_folder  TEXT NOT NULL,
+    status      TEXT,
+    has_error   INTEGER NOT NULL DEFAULT 0,
+    recorded_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_job ON job_history (job_folder, recorded_at);
+
+-- histórico: uma linha a cada status novo de um job
+CREATE TRIGGER IF NOT EXISTS trg_jobs_insert AFTER INSERT ON jobs
+BEGIN
+    INSERT INTO job_history (job_folder, status, has_error, recorded_at)
+    VALUES (new.job_folder, new.status, new.has_error, new.processed_at);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_jobs_status AFTER UPDATE OF status, has_error ON jobs
+WHEN old.status IS NOT new.status OR old.has_error IS NOT new.has_error
+BEGIN
+    INSERT INTO job_history (job_folder, status, has_error, recorded_at)
+    VALUES (new.job_folder, new.status, new.has_error, new.processed_at);
+END;
+"""
+
+
+class JobCatalog:
+    """Catálogo SQLite local com os dados de cada job processado.
+
+    process_job_folder registra as linhas com add() (de qualquer thread) e elas
+    são gravadas em uma transação por lote em flush().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._rows = []
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(CATALOG_SCHEMA)
+
+    def add(self, job_folder, xml_data, imagem_id, status, has_error, errors, output_dir):
+        now = datetime.now().isoformat(sep=" ", timespec="seconds")
+        row = (
+            job_folder,
+            xml_data.get("Name"),
+            xml_data.get("Description"),
+            xml_data.get("Computer"),
+            xml_data.get("Active"),
+            xml_data.get("Complete"),
+            normalize_datetime_for_mysql(xml_data.get("Submitted")),
+            normalize_datetime_for_mysql(xml_data.get("LastUpdated")),
+            xml_data.get("ExrPath"),
+            output_dir,
+            imagem_id,
+            status,
+            1 if has_error else 0,
+            errors or None,
+            now,
+            now,
+        )
+        with self._lock:
+            self._rows.append(row)
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return
+        try:
+            with self._db:
+                self._db.executemany(
+                    """
+                    INSERT INTO jobs (job_folder, name, description, computer, active, complete,
+                                      submitted, last_updated, exr_path, output_dir, imagem_id,
+                                      status, has_error, errors, first_seen, processed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (job_folder) DO UPDATE SET
+                        name = excluded.name,
+                        description = excluded.description,
+                        computer = excluded.computer,
+                        active = excluded.active,
+                        complete = excluded.complete,
+                        submitted = excluded.submitted,
+                        last_updated = excluded.last_updated,
+                        exr_path = excluded.exr_path,
+                        output_dir = excluded.output_dir,
+                        imagem_id = excluded.imagem_id,
+                        status = excluded.status,
+                        has_error = excluded.has_error,
+                        errors = excluded.errors,
+                        processed_at = excluded.processed_at
+                    """,
+                    rows,
+                )
+        except sqlite3.Error as e:
+            # o catálogo é só para consulta; uma falha aqui não interrompe o processamento
+            log_and_print(f"⚠ Erro ao gravar o catálogo local: {e}", "warning")
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
 
+_job_catalog = None
+_job_catalog_lock = threading.Lock()
 
-def process_job_folder(cursor, job_folder, p00_rollup=None):
+
+def get_job_catalog():
+    """Retorna o catálogo local (aberto no primeiro uso) ou None se estiver desativado."""
+    global _job_catalog
+    if JOB_CATALOG == "0":
+        return None
+    with _job_catalog_lock:
+        if _job_catalog is None:
+            try:
+                _job_catalog = JobCatalog(JOB_CATALOG)
+            except (OSError, sqlite3.Error) as e:
+                log_and_print(f"⚠ Catálogo local indisponível ({JOB_CATALOG}): {e}", "warning")
+                return None
+        return _job_catalog
+
+
+def close_job_catalog():
+    global _job_catalog
+    with _job_catalog_lock:
+        catalog, _job_catalog = _job_catalog, None
+    if catalog is not None:
+        catalog.close()
+
+
+class PreparedJob(NamedTuple):
+    """Job já lido do disco (XML e log) e com a imagem resolvida no banco."""
+    job_folder: str
+    xml_data: dict
+    has_error: bool
+    errors: str
+    imagem_id: int
+    caminho_pasta: Optional[str]
+    fingerprint: dict
+
+
+def prepare_job(cursor, job, p00_rollup=None, fingerprints=None):
+    """Primeira etapa do processamento: lê XML e log e resolve imagem_id.
+
+    Retorna um PreparedJob, o registro anterior de JOB_FINGERPRINTS quando o job
+    não mudou, ou None quando não há o que processar.
+    """
+    if not isinstance(job, JobFolder):
+        job, _ = scan_job_folder(job)
+    job_folder = job.path
     folder_name = os.path.basename(job_folder)
     if EXCLUDE_KEYWORD in folder_name.upper():
         log_and_print(f"Ignorado (ANIMA): {job_folder}")
         return
 
-    log_and_print(f"\nProcessando pasta: {job_folder}")
+    log_and_print(f"\nProcessando pasta: {job_folder}", "debug")
 
-    xml_file = None
-    log_file = None
-    for f in os.listdir(job_folder):
-        if f.lower().endswith(".xml"):
-            xml_file = os.path.join(job_folder, f)
-        if f.lower().endswith(".txt") or f.lower().endswith(".log"):
-            log_file = os.path.join(job_folder, f)
+    xml_file = job.xml_file
+    log_file = job.log_file
 
     if not xml_file:
         log_and_print(f"⚠ Nenhum XML encontrado em {job_folder}")
@@ -340,6 +2621,15 @@ def process_job_folder(cursor, job_folder, p00_rollup=None):
         log_and_print(f"⚠ Nenhum log encontrado em {job_folder}")
         return
 
+    # Impressão digital tirada antes da leitura, para não perder alterações feitas durante o processamento
+    fingerprint = {"xml": job.xml_sig, "log": job.log_sig}
+    if _job_unchanged(fingerprints, job_folder, fingerprint):
+        prev = fingerprints[job_folder]
+        if prev.get("p00") and p00_rollup is not None:
+            _accumulate_p00(p00_rollup, prev["p00"])
+        log_and_print(f"⏭ Sem alterações desde o último processamento: {job_folder}", "debug")
+        return prev
+
     xml_data = parse_xml(xml_file)
     has_error, errors = check_log(log_file)
 
@@ -353,40 +2643,71 @@ def process_job_folder(cursor, job_folder, p00_rollup=None):
         log_and_print(f"Imagem não encontrada para {image_name_xml}")
         return
 
-    exr_path = xml_data.get("ExrPath")
-    if exr_path:
-        # Normaliza e trata drives diferentes:
-        # - M: -> \\192.168.0.250\renders2
-        # - Y: -> \\192.168.0.250\renders (comportamento anterior)
-        # Caso não seja um drive conhecido, usa o caminho original.
-        if re.match(r'^[Mm]:', exr_path):
-            caminho_pasta = os.path.dirname(exr_path.replace(exr_path[:2], r"\\192.168.0.250\renders2"))
-        elif re.match(r'^[Yy]:', exr_path):
-            caminho_pasta = os.path.dirname(exr_path.replace(exr_path[:2], r"\\192.168.0.250\renders"))
-        elif re.match(r'^[Nn]:', exr_path):
-            caminho_pasta = os.path.dirname(exr_path.replace(exr_path[:2], r"\\192.168.0.250\exchange"))
-        else:
-            caminho_pasta = os.path.dirname(exr_path)
+    # Drives mapeados (M:, Y:, N: ...) viram o caminho UNC do servidor de render
+    caminho_pasta = resolve_output_dir(xml_data.get("ExrPath"))
+
+    fingerprint["output"] = output_folders.signature(caminho_pasta)
+    return PreparedJob(job_folder, xml_data, has_error, errors, imagem_id, caminho_pasta, fingerprint)
+
+
+def process_job_folder(cursor, job, p00_rollup=None, fingerprints=None, contexts=None, writes=None,
+                       transfers=None):
+    """Processa uma pasta de job do Backburner.
+
+    job pode ser um PreparedJob, um JobFolder vindo de discover_jobs ou o
+    caminho da pasta. contexts é o resultado de load_image_contexts para as
+    imagens do lote; sem ele o contexto da imagem é buscado na hora. writes é
+    o RenderWriteBuffer do lote; sem ele as gravações do job são aplicadas
+    no fim desta chamada. transfers é a PreviewTransferQueue que envia as
+    prévias; sem ela os envios acontecem nesta chamada. Um envio que falhar
+    depois do retorno aparece em transfers.join().
+    Retorna um dicionário com a impressão digital dos arquivos do job quando o
+    processamento terminou de forma definitiva (para ser gravado em
+    JOB_FINGERPRINTS), ou None quando o job deve ser reprocessado na próxima
+    execução.
+    """
+    if isinstance(job, PreparedJob):
+        prepared = job
     else:
-        caminho_pasta = None
-
-    # Buscar informações complementares
-    cursor.execute("SELECT imagem_nome FROM imagens_cliente_obra WHERE idimagens_cliente_obra = %s", (imagem_id,))
-    row = cursor.fetchone()
-    image_name_db = row[0] if row else None
-
-    resp_id, funcao_id = find_responsavel_id(cursor, imagem_id)
-    status_id = find_status_id(cursor, imagem_id)
-
-    # Buscar status existente
-    cursor.execute("""
-        SELECT idrender_alta, status, previa_jpg
-        FROM render_alta
-        WHERE imagem_id = %s AND status_id = %s
-        ORDER BY idrender_alta DESC
-        LIMIT 1
-    """, (imagem_id, status_id))
-    existing_status = cursor.fetchone()
+        prepared = prepare_job(cursor, job, p00_rollup, fingerprints)
+        if not isinstance(prepared, PreparedJob):
+            return prepared
+
+    if writes is None:
+        writes = RenderWriteBuffer()
+        result = process_job_folder(cursor, prepared, p00_rollup, contexts=contexts, writes=writes,
+                                    transfers=PreviewTransferQueue(connections=0))
+        writes.flush(cursor)
+        catalog = get_job_catalog()
+        if catalog is not None:
+            catalog.flush()
+        return result
+
+    xml_data = prepared.xml_data
+    has_error = prepared.has_error
+    errors = prepared.errors
+    imagem_id = prepared.imagem_id
+    caminho_pasta = prepared.caminho_pasta
+    result = {"fingerprint": prepared.fingerprint, "output_dir": caminho_pasta, "p00": None}
+
+    # Informações complementares (pré-carregadas em lote quando possível)
+    ctx = (contexts or {}).get(imagem_id)
+    if ctx is None:
+        ctx = load_image_contexts(cursor, [imagem_id]).get(imagem_id)
+        if ctx is None:
+            log_and_print(f"Imagem não encontrada para imagem_id {imagem_id}", "warning")
+            return None
+        if contexts is not None:
+            contexts[imagem_id] = ctx
+
+    image_name_db = ctx["imagem_nome"]
+    resp_id, funcao_id = ctx["resp_id"], ctx["funcao_id"]
+    status_id = ctx["status_id"]
+    log_and_print(f"Colaborador: {resp_id} (função {funcao_id}), status atual: {status_id}", "debug")
+
+    # Status existente (último render_alta do status atual da imagem)
+    with ctx["lock"]:
+        existing_status = ctx["render"]
 
     render_id = existing_status[0] if existing_status else None
     ultimo_status = existing_status[1] if existing_status else None
@@ -405,69 +2726,57 @@ def process_job_folder(cursor, job_folder, p00_rollup=None):
     else:
         status_custom = complete or "Desconhecido"
 
+    catalog = get_job_catalog()
+    if catalog is not None:
+        catalog.add(prepared.job_folder, xml_data, imagem_id, status_custom, has_error, errors, caminho_pasta)
+
     # Acumular status do P00 por imagem (para notificação única)
     if status_id == 1 and p00_rollup is not None:
-        roll = p00_rollup.get(imagem_id)
-        if not roll:
-            roll = {
-                "image_name_db": image_name_db,
-                "resp_id": resp_id,
-                "funcao_id": funcao_id,
-                "total_jobs": 0,
-                "completed_jobs": 0,
-                "any_error": False,
-                "any_incomplete": False,
-                "all_complete": True
-            }
-            p00_rollup[imagem_id] = roll
-
-        roll["total_jobs"] += 1
-        if resp_id and not roll.get("resp_id"):
-            roll["resp_id"] = resp_id
-
-        complete_val = (xml_data.get("Complete") or "").strip().lower()
-        if has_error:
-            roll["any_error"] = True
-        if complete_val == "yes":
-            roll["completed_jobs"] += 1
-        else:
-            roll["all_complete"] = False
-            roll["any_incomplete"] = True
+        result["p00"] = {
+            "imagem_id": imagem_id,
+            "image_name_db": image_name_db,
+            "resp_id": resp_id,
+            "funcao_id": funcao_id,
+            "has_error": has_error,
+            "complete": complete
+        }
+        _accumulate_p00(p00_rollup, result["p00"])
 
     # Caminho remoto fixo para todas as imagens
     remote_base_path = "/web/improov.com.br/public_html/flow/ImproovWeb/uploads/renders/"
 
     # 1️⃣ Se status atual = Em aprovação e não tiver previa_jpg → atualizar só a coluna
     if ultimo_status == "Em aprovação":
-        if not existing_preview and caminho_pasta and os.path.exists(caminho_pasta):
-            jpgs = [f for f in os.listdir(caminho_pasta) if f.lower().endswith(".jpg")]
+        if not existing_preview and caminho_pasta:
+            jpgs = output_folders.jpgs(caminho_pasta)
             if jpgs:
                 preview_name = jpgs[0]
 
                 # Upload da prévia
                 local_path = os.path.join(caminho_pasta, preview_name)
-                remote_path = remote_base_path + preview_name  # sempre dentro de /www/sistema/uploads/renders/
-                ftp_host = os.getenv("FTP_HOST")
-                ftp_user = os.getenv("FTP_USER")
-                ftp_pass = os.getenv("FTP_PASS")
-                upload_ok = upload_to_ftp(local_path, remote_path, ftp_host, ftp_user, ftp_pass)
-
-                if upload_ok:
-                    # Atualiza banco apenas se o upload teve sucesso
-                    cursor.execute("""
-                        UPDATE render_alta
-                        SET previa_jpg = %s
-                        WHERE idrender_alta = %s
-                    """, (preview_name, render_id))
-                    log_and_print(f"🖼️ Previa JPG atualizada para {preview_name} (status já era 'Em aprovação')")
-                else:
-                    log_and_print(f"⚠ Upload falhou — nenhuma alteração foi feita no banco para {preview_name}", "warning")
-            return  # não faz mais nada
+                derivatives = submit_preview_derivatives([local_path])
+
+                def previa_enviada(uploaded, upload_ok):
+                    if upload_ok:
+                        # Atualiza banco apenas se o upload teve sucesso
+                        writes.set_previa((imagem_id, status_id), render_id, preview_name, prepared.job_folder)
+                        with ctx["lock"]:
+                            # um job posterior da imagem pode já ter gravado um render mais novo
+                            if ctx["render"] == existing_status:
+                                ctx["render"] = (render_id, ultimo_status, preview_name)
+                        log_and_print(f"🖼️ Previa JPG atualizada para {preview_name} (status já era 'Em aprovação')")
+                    else:
+                        # tenta de novo na próxima execução
+                        log_and_print(f"⚠ Upload falhou — nenhuma alteração foi feita no banco para {preview_name}", "warning")
+
+                transfers.submit(prepared.job_folder, remote_base_path,
+                                 [(local_path, preview_name, derivatives)], previa_enviada)
+            return result  # não faz mais nada
 
     # 2️⃣ Se status atual = Aprovado ou Finalizado → não faz nada
     if ultimo_status in ("Aprovado", "Finalizado"):
         log_and_print(f"⏭ Status '{ultimo_status}' detectado — nenhum update realizado.")
-        return
+        return result
 
     # 3️⃣ Se status estava como Erro e Complete=Yes → mudar para Em aprovação
     if ultimo_status == "Erro" and complete == "yes":
@@ -475,31 +2784,25 @@ def process_job_folder(cursor, job_folder, p00_rollup=None):
         log_and_print("🔄 Status alterado de 'Erro' para 'Em aprovação' pois Complete=Yes")
 
 
-    log_and_print(f"Procurando JPGs em: {caminho_pasta}")
+    log_and_print(f"Procurando JPGs em: {caminho_pasta}", "debug")
 
     # 4️⃣ Fluxo normal para Em andamento ou novo registro
     previa_val = None
-    if caminho_pasta and os.path.exists(caminho_pasta):
+    previews_to_send = []
+    if caminho_pasta:
         # Collect all JPGs (angles). We'll upload each and store in render_previews.
-        jpgs = [f for f in os.listdir(caminho_pasta) if f.lower().endswith(".jpg")]
+        jpgs = output_folders.jpgs(caminho_pasta)
         if jpgs:
             # Sort to have deterministic order (e.g., LD1_RES_001, LD1_RES_002 ...)
             jpgs.sort()
             previa_val = jpgs[0]  # legacy: store the first one in render_alta.prevista_jpg
 
-            ftp_host = os.getenv("FTP_HOST")
-            ftp_user = os.getenv("FTP_USER")
-            ftp_pass = os.getenv("FTP_PASS")
-
-            uploaded_previews = []
-            for jpg in jpgs:
-                local_path = os.path.join(caminho_pasta, jpg)
-                remote_path = remote_base_path + jpg
-                upload_ok = upload_to_ftp(local_path, remote_path, ftp_host, ftp_user, ftp_pass)
-                if upload_ok:
-                    uploaded_previews.append(jpg)
+            # derivados de todos os ângulos pedidos de uma vez; a conversão roda em paralelo
+            # e cada envio só espera o seu arquivo, na thread da fila de envios
+            derivatives = submit_preview_derivatives([os.path.join(caminho_pasta, jpg) for jpg in jpgs])
+            previews_to_send = [(os.path.join(caminho_pasta, jpg), jpg, derivatives) for jpg in jpgs]
 
-            # After uploading all previews, we'll insert them into render_previews once render_id is known.
+            # The uploads are queued at the end, after the render_alta row, so render_previews can reference it.
 
 
     # Normalizar datas vindas do XML para um formato aceito pelo MySQL
@@ -516,14 +2819,8 @@ def process_job_folder(cursor, job_folder, p00_rollup=None):
     if status_id == 1 and ultimo_status is not None:
         status_to_write = ultimo_status
 
-    cursor.execute("""
-        INSERT INTO render_alta
-        (imagem_id, responsavel_id, status_id, status, data, computer, submitted, last_updated, has_error, errors, job_folder, previa_jpg, numero_bg)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON DUPLICATE KEY UPDATE
-            status=VALUES(status),
-            previa_jpg=IFNULL(VALUES(previa_jpg), previa_jpg)
-    """, (
+    render_key = (imagem_id, status_id)
+    writes.add_render((
         imagem_id,
         resp_id,
         status_id,
@@ -541,48 +2838,18 @@ def process_job_folder(cursor, job_folder, p00_rollup=None):
 
     log_and_print(f"✅ Render atualizado/inserido — status={status_custom}, previa_jpg={previa_val}")
 
+    # render_id de um render novo só é conhecido no flush do lote
+    with ctx["lock"]:
+        ctx["render"] = (render_id, status_to_write, previa_val or existing_preview)
 
-    
-    # 🔹 Buscar render_id com imagem_id e status_id
-    cursor.execute(
-        "SELECT idrender_alta FROM render_alta WHERE imagem_id = %s AND status_id = %s",
-        (imagem_id, status_id)
-    )
-    render_row = cursor.fetchone()
-    render_id = render_row[0] if render_row else None
-
-    # 🔹 Buscar obra_id pela imagem_id (não precisa mudar nada aqui)
-    cursor.execute(
-        "SELECT obra_id FROM imagens_cliente_obra WHERE idimagens_cliente_obra = %s",
-        (imagem_id,)
-    )
-    obra_row = cursor.fetchone()
-    obra_id = obra_row[0] if obra_row else None
-
-    # 🔹 Buscar responsável da pós-produção (funcao_id = 5)
-    cursor.execute(
-        "SELECT colaborador_id FROM funcao_imagem WHERE funcao_id = 5 AND imagem_id = %s",
-        (imagem_id,)
-    )
-    pos_row = cursor.fetchone()
-    responsavel_pos_id = pos_row[0] if pos_row else None
+    obra_id = ctx["obra_id"]
+    # 🔹 Responsável da pós-produção (funcao_id = 5)
+    responsavel_pos_id = ctx["pos_resp_id"]
 
     # 🔹 Inserir ou atualizar na tabela pós-produção
     # Não criar registro de pós-produção quando status_id == 1
     if responsavel_pos_id and status_id != 1:
-        cursor.execute("""
-            INSERT INTO pos_producao
-            (render_id, imagem_id, obra_id, colaborador_id, caminho_pasta, numero_bg, status_id, responsavel_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                obra_id = VALUES(obra_id),
-                colaborador_id = VALUES(colaborador_id),
-                caminho_pasta = VALUES(caminho_pasta),
-                numero_bg = VALUES(numero_bg),
-                status_id = VALUES(status_id),
-                responsavel_id = VALUES(responsavel_id)
-        """, (
-            render_id,
+        writes.add_pos_producao(render_key, (
             imagem_id,
             obra_id,
             resp_id,
@@ -591,7 +2858,7 @@ def process_job_folder(cursor, job_folder, p00_rollup=None):
             status_id,
             responsavel_pos_id
         ))
-        log_and_print(f"📌 Pós-produção vinculada: render_id={render_id}, imagem_id={imagem_id}, obra_id={obra_id}")
+        log_and_print(f"📌 Pós-produção vinculada: imagem_id={imagem_id}, obra_id={obra_id}", "debug")
     else:
         if responsavel_pos_id and status_id == 1:
             log_and_print(f"⚠ Pos-produção não criada pois status_id == 1 para imagem_id {imagem_id}")
@@ -616,140 +2883,559 @@ def process_job_folder(cursor, job_folder, p00_rollup=None):
             # Enviar para canal de renders
             send_webhook_message(msg)
 
-            # Buscar usuário e enviar DM
-            cursor.execute("SELECT nome_slack FROM usuario WHERE idcolaborador = %s", (resp_id,))
-            slack_names = cursor.fetchall()
-            for slack_name_tuple in slack_names:
-                slack_name = slack_name_tuple[0]
-                user_id = get_user_id_by_name(slack_name)
-                if user_id:
-                    send_dm_to_user(user_id, msg)
+            # Enviar DM ao responsável (nomes carregados com o contexto)
+            for slack_name in ctx["slack_names"]:
+                send_dm_to_slack_name(slack_name, msg)
 
             # Inserir notificação no banco
-            cursor.execute(
-                "INSERT INTO notificacoes (colaborador_id, mensagem) VALUES (%s, %s)",
-                (resp_id, msg)
-            )
+            writes.add_notification(resp_id, msg)
             log_and_print(f"🔔 Notificação enviada para colaborador {resp_id} e canal de renders.")
 
         # Atualizar função e imagem
     if status_custom == "Em aprovação" and funcao_id:
-        cursor.execute("""
-            UPDATE funcao_imagem
-            SET status = 'Finalizado', prazo = NOW()
-            WHERE imagem_id = %s AND funcao_id = %s
-        """, (imagem_id, funcao_id))
-        log_and_print(f"Função atualizada para Finalizado para imagem_id {imagem_id}")
-
-        cursor.execute("""
-            UPDATE imagens_cliente_obra
-            SET substatus_id = 5
-            WHERE idimagens_cliente_obra = %s
-        """, (imagem_id,))
-        log_and_print(f"Imagem atualizada para status = REN na imagem_id {imagem_id}")
+        writes.finish_funcao(imagem_id, funcao_id)
+        log_and_print(f"Função atualizada para Finalizado para imagem_id {imagem_id}", "debug")
+        log_and_print(f"Imagem atualizada para status = REN na imagem_id {imagem_id}", "debug")
 
     # -------------------------------
     # Salvar previews múltiplos (angles) na tabela render_previews
     # -------------------------------
-    try:
+    def previews_enviados(uploaded_previews, upload_ok):
+        # Se algum upload falhou, transfers.join() devolve o job e a impressão digital não é gravada.
         # Apenas registre previews múltiplos se o status da imagem for P00 (status_id == 1)
-        if 'uploaded_previews' in locals() and uploaded_previews and render_id and status_id == 1:
-            # Use INSERT ... ON DUPLICATE KEY UPDATE noop para evitar duplicatas.
+        if uploaded_previews and status_id == 1:
+            writes.add_previews(render_key, uploaded_previews, prepared.job_folder)
             for filename in uploaded_previews:
-                try:
-                    cursor.execute(
-                        "INSERT INTO render_previews (render_id, filename) VALUES (%s, %s) ON DUPLICATE KEY UPDATE filename=filename",
-                        (render_id, filename)
-                    )
-                    log_and_print(f"➕ Preview registrado: {filename} -> render_id {render_id}")
-                except Exception as e:
-                    log_and_print(f"⚠ Falha ao inserir preview {filename}: {e}", "warning")
-        else:
-            if 'uploaded_previews' in locals() and uploaded_previews:
-                log_and_print(f"ℹ Previews encontrados, mas não registrados (status_id={status_id})")
+                log_and_print(f"➕ Preview registrado: {filename} -> imagem_id {imagem_id}", "debug")
+        elif uploaded_previews:
+            log_and_print(f"ℹ Previews encontrados, mas não registrados (status_id={status_id})", "debug")
+
+    if previews_to_send:
+        transfers.submit(prepared.job_folder, remote_base_path, previews_to_send, previews_enviados)
+
+    return result
+
+class JobRunner:
+    """Executa uma função por job, em série ou num pool de threads.
+
+    Em série, usa o cursor da conexão principal. Em paralelo, cada worker tem
+    sua própria conexão para as consultas pontuais e cada chamada é confirmada
+    (commit) nela; as gravações do lote passam pelo RenderWriteBuffer. map() devolve os resultados na ordem de entrada,
+    mas a ordem de execução entre workers é livre: itens que dependem uns dos
+    outros (jobs da mesma imagem) devem ir juntos num único item.
+    """
+
+    def __init__(self, cursor, workers=1):
+        self.cursor = cursor
+        self.workers = workers
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._executor = None
+        if workers > 1:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+
+    def _worker_connection(self):
+        worker_conn = getattr(self._local, "conn", None)
+        if worker_conn is None:
+            worker_conn = db.acquire()
+            self._local.conn = worker_conn
+            with self._connections_lock:
+                self._connections.append(worker_conn)
+        return worker_conn
+
+    def _call(self, fn, item):
+        try:
+            worker_conn = self._worker_connection()
+            with worker_conn.cursor() as cursor:
+                value = fn(cursor, item)
+            worker_conn.commit()
+            return value
+        except Exception as e:
+            log_and_print(f"❌ Erro no worker: {e}", "error")
+            worker_conn = getattr(self._local, "conn", None)
+            if worker_conn is not None:
+                db.rollback(worker_conn)
+            return None
+
+    def map(self, fn, items):
+        """Aplica fn(cursor, item); no modo paralelo, itens cujo commit falhou viram None."""
+        if self._executor is None:
+            return [fn(self.cursor, item) for item in items]
+        return list(self._executor.map(lambda item: self._call(fn, item), items))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        for worker_conn in self._connections:
+            db.release(worker_conn)
+        self._connections = []
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _prepare_task(cursor, job, fingerprints):
+    job_rollup = {}
+    try:
+        return job, prepare_job(cursor, job, job_rollup, fingerprints), job_rollup
     except Exception as e:
-        log_and_print(f"⚠ Erro ao processar previews: {e}", "warning")
+        log_and_print(f"❌ Erro ao processar a pasta {job.path}: {e}", "error")
+        return job, None, {}
+
+
+def _process_task(cursor, prepared, contexts, writes, transfers):
+    job_rollup = {}
+    try:
+        result = process_job_folder(cursor, prepared, job_rollup, contexts=contexts, writes=writes,
+                                    transfers=transfers)
+        return prepared, result, job_rollup
+    except Exception as e:
+        log_and_print(f"❌ Erro ao processar a pasta {prepared.job_folder}: {e}", "error")
+        # descarta o acumulado de um job que não terminou
+        return prepared, None, {}
+
+
+def _process_group(cursor, group, contexts, writes, transfers):
+    """Processa em série, na ordem de descoberta, os jobs de uma mesma imagem.
+
+    Cada job lê o status deixado pelo anterior (ctx["render"]) para decidir o
+    que gravar e notificar; num só worker isso não depende do agendamento.
+    """
+    return [_process_task(cursor, prepared, contexts, writes, transfers) for prepared in group]
+
+
+def _discard_fingerprints(new_fingerprints, job_folders):
+    """Tira do resultado os jobs cujos registros não foram gravados (reprocessados na próxima execução)."""
+    dropped = [job_folder for job_folder in job_folders if new_fingerprints.pop(job_folder, None) is not None]
+    if dropped:
+        metrics.inc("jobs", len(dropped), result="falha")
+        log_and_print(f"⚠ {len(dropped)} job(s) com registros de prévias não gravados; serão reprocessados", "warning")
+
+
+def process_jobs(cursor, runner, jobs, fingerprints, batch_size):
+    """Processa os jobs em lotes; retorna (acumulado do P00, impressões digitais novas).
+
+    Em cada lote: 1) lê XML/log e resolve a imagem, 2) carrega o contexto de
+    todas as imagens do lote de uma vez, 3) processa cada job e 4) grava e
+    confirma o lote. As prévias são enviadas em segundo plano enquanto os
+    lotes seguintes são processados; o que os envios concluídos registram
+    (previa_jpg, render_previews) entra na gravação do lote seguinte, e no
+    fim a fila é esvaziada antes da última gravação.
+    """
+    p00_rollup = {}
+    new_fingerprints = {}
+    transfers = get_preview_transfers()
+    # compartilhado entre os lotes: os envios de um lote terminam durante o próximo
+    writes = RenderWriteBuffer()
+    for batch in _batched(jobs, batch_size):
+        to_process = []
+        for out in runner.map(lambda cur, job: _prepare_task(cur, job, fingerprints), batch):
+            if out is None:
+                metrics.inc("jobs", result="falha")
+                continue
+            job, prepared, job_rollup = out
+            _merge_p00_rollup(p00_rollup, job_rollup)
+            if isinstance(prepared, PreparedJob):
+                to_process.append(prepared)
+            elif prepared:
+                new_fingerprints[job.path] = prepared
+                metrics.inc("jobs", result="sem_alteracao")
+            else:
+                metrics.inc("jobs", result="ignorado")
+
+        if not to_process:
+            continue
+        contexts = load_image_contexts(cursor, [p.imagem_id for p in to_process])
+        # jobs da mesma imagem ficam com um único worker, na ordem de descoberta
+        groups = {}
+        for prepared in to_process:
+            groups.setdefault(prepared.imagem_id, []).append(prepared)
+        batch_fingerprints = {}
+        for outs in runner.map(lambda cur, group: _process_group(cur, group, contexts, writes, transfers),
+                               list(groups.values())):
+            if outs is None:
+                continue
+            for prepared, result, job_rollup in outs:
+                _merge_p00_rollup(p00_rollup, job_rollup)
+                if result:
+                    batch_fingerprints[prepared.job_folder] = result
+
+        # Gravações do lote em poucas instruções, confirmadas por lote
+        try:
+            writes.flush(cursor)
+            cursor.connection.commit()
+        except Exception as e:
+            log_and_print(f"❌ Erro ao gravar o lote no banco: {e}", "error")
+            db.rollback(cursor.connection)
+            metrics.inc("jobs", len(to_process), result="falha")
+            # registros de envios de lotes anteriores que iam nesta gravação também se perderam
+            _discard_fingerprints(new_fingerprints, writes.flushed_jobs)
+            continue
+        metrics.inc("jobs", len(batch_fingerprints), result="processado")
+        metrics.inc("jobs", len(to_process) - len(batch_fingerprints), result="falha")
+        catalog = get_job_catalog()
+        if catalog is not None:
+            catalog.flush()
+        new_fingerprints.update(batch_fingerprints)
+
+    # Envios ainda na fila: espera e grava o que eles registraram
+    failed = transfers.join()
+    try:
+        if len(writes):
+            writes.flush(cursor)
+            cursor.connection.commit()
+    except Exception as e:
+        log_and_print(f"❌ Erro ao gravar os registros das prévias enviadas: {e}", "error")
+        db.rollback(cursor.connection)
+        _discard_fingerprints(new_fingerprints, writes.flushed_jobs)
+    # jobs com algum envio que falhou são reprocessados na próxima execução
+    for job_folder in failed:
+        if new_fingerprints.pop(job_folder, None) is not None:
+            metrics.inc("jobs", result="falha_upload")
+    if failed:
+        log_and_print(f"⚠ {len(failed)} job(s) com falha no envio das prévias; serão reprocessados", "warning")
+    return p00_rollup, new_fingerprints
+
+
+def _p00_status(roll):
+    """Status agregado do P00 de uma imagem a partir do acumulado dos jobs."""
+    if roll.get("any_error", False):
+        return "Erro"
+    if roll.get("any_incomplete", False):
+        return "Em andamento"
+    if roll.get("all_complete", False) and roll.get("total_jobs", 0) > 0:
+        return "Em aprovação"
+    return "Desconhecido"
+
+
+@timed_stage("p00")
+def finalize_p00_rollup(cursor, p00_rollup):
+    """Grava o status agregado do P00 de cada imagem e notifica quando ele muda.
+
+    Tudo em lote: uma consulta traz o último render P00 de cada imagem, um
+    UPDATE com CASE grava os status que mudaram e uma consulta resolve o
+    nome_slack dos responsáveis que serão notificados.
+    """
+    # Notificação agregada para P00 (status_id = 1)
+    if not p00_rollup:
+        return
+    status_agg = {imagem_id: _p00_status(roll) for imagem_id, roll in p00_rollup.items()}
+
+    # 🔹 Último render_alta P00 de cada imagem
+    latest = {}
+    for chunk in _chunks(sorted(p00_rollup)):
+        cursor.execute(f"""
+            SELECT r.imagem_id, r.idrender_alta, r.status
+            FROM render_alta r
+            JOIN (
+                SELECT imagem_id, MAX(idrender_alta) AS idrender_alta
+                FROM render_alta
+                WHERE status_id = 1 AND imagem_id IN ({", ".join(["%s"] * len(chunk))})
+                GROUP BY imagem_id
+            ) ultimo ON ultimo.idrender_alta = r.idrender_alta
+        """, chunk)
+        for imagem_id, render_id, status in cursor.fetchall():
+            latest[imagem_id] = (render_id, status)
+
+    # Status que mudaram: só esses são gravados e geram notificação
+    changed = [
+        imagem_id for imagem_id in sorted(p00_rollup)
+        if status_agg[imagem_id] != latest.get(imagem_id, (None, None))[1]
+    ]
+
+    # Atualiza status agregado no render_alta (mantém estado único por imagem)
+    updates = [(latest[imagem_id][0], status_agg[imagem_id]) for imagem_id in changed if imagem_id in latest]
+    for chunk in _chunks(updates):
+        cases = " ".join(["WHEN %s THEN %s"] * len(chunk))
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(
+            f"UPDATE render_alta SET status = CASE idrender_alta {cases} END "
+            f"WHERE idrender_alta IN ({placeholders})",
+            [v for item in chunk for v in item] + [render_id for render_id, _ in chunk]
+        )
+
+    messages = []
+    for imagem_id in changed:
+        roll = p00_rollup[imagem_id]
+        resp_id = roll.get("resp_id")
+        image_name_db = roll.get("image_name_db")
+        if not resp_id:
+            continue
+        if status_agg[imagem_id] == "Erro":
+            msg = f"O render da imagem: {image_name_db} deu erro, favor verificar!"
+        elif status_agg[imagem_id] == "Em aprovação":
+            msg = f"O render da imagem: {image_name_db} foi concluído com sucesso, favor aprovar!"
+        elif status_agg[imagem_id] == "Em andamento":
+            msg = f"O render da imagem: {image_name_db} está em andamento."
+        else:
+            continue
+        messages.append((resp_id, msg))
+
+    log_and_print(
+        f"P00: {len(p00_rollup)} imagens, {len(updates)} status atualizados, {len(messages)} notificações", "debug"
+    )
+    if not messages:
+        return
+
+    # 🔹 nome_slack de todos os responsáveis numa única consulta
+    slack_names = {}
+    for chunk in _chunks(sorted({resp_id for resp_id, _ in messages})):
+        cursor.execute(
+            f"SELECT idcolaborador, nome_slack FROM usuario WHERE idcolaborador IN ({', '.join(['%s'] * len(chunk))})",
+            chunk
+        )
+        for colaborador_id, nome_slack in cursor.fetchall():
+            slack_names.setdefault(colaborador_id, []).append(nome_slack)
+
+    for resp_id, msg in messages:
+        send_webhook_message(msg)
+        for slack_name in slack_names.get(resp_id, ()):
+            send_dm_to_slack_name(slack_name, msg)
+        log_and_print(f"🔔 Notificação P00 enviada para colaborador {resp_id} e canal de renders.")
+
+    cursor.executemany(
+        "INSERT INTO notificacoes (colaborador_id, mensagem) VALUES (%s, %s)",
+        messages
+    )
+
+
+def log_run_summary():
+    """Resumo curto das métricas da execução no log."""
+    summary = metrics.summary()
+    jobs = summary.get("jobs", {})
+    db = summary.get("db", {})
+    stages = summary.get("stage", {})
+    log_and_print(
+        f"📊 {summary['duration_s']:.1f}s — jobs: "
+        + (", ".join(f"{k}={v}" for k, v in jobs.items()) or "nenhum")
+        + f"; SQL: {sum(v['calls'] for v in db.values())} instruções"
+        + f"; FTP: {summary.get('ftp_bytes', 0) / 1048576:.1f} MiB"
+        + f"; Slack: {sum(v['calls'] for v in summary.get('slack', {}).values())} chamadas"
+    )
+    for stage, v in sorted(stages.items(), key=lambda kv: -kv[1]["seconds"]):
+        log_and_print(f"   {stage}: {v['calls']}x, {v['seconds']:.2f}s (média {v['avg_ms']:.1f} ms)")
 
-def main():
+
+def _start_run(workers):
+    global ftp_max_sessions
+    try:
+        log_and_print(f"Usuário: {os.getlogin()}")
+    except OSError:
+        pass
+    log_and_print(f"Diretório atual: {os.getcwd()}")
+    log_and_print(f".env carregado: {os.getenv('DB_HOST')}")
+    output_folders.clear()
+    if workers > 1:
+        log_and_print(f"Processando com {workers} workers em paralelo")
+    if not os.getenv("FTP_MAX_SESSIONS"):
+        # os envios saem das threads da fila de prévias (ou dos workers, se ela estiver desligada)
+        ftp_max_sessions = FTP_TRANSFER_CONNECTIONS or workers
+    if os.getenv("SLACK_ASYNC", "1") != "0":
+        start_notification_dispatcher()
+
+
+def _finish_run():
+    db.close()
+    close_job_catalog()
+    # os envios pendentes ainda podem esperar conversões do pool de derivados
+    close_preview_transfers()
+    close_derivative_pool()
+    prune_derivatives()
+    close_ftp_pools()
+    # os uploads já aconteceram, então o manifesto é gravado mesmo se a execução falhar
+    save_upload_manifest()
+    # entrega o que ficou na fila antes de sair
+    stop_notification_dispatcher(timeout=float(os.getenv("SLACK_DRAIN_TIMEOUT", "120")))
+
+
+def main(full=False, workers=1):
     log_and_print(f"Iniciando processamento da pasta: {PARENT_FOLDER}")
-    with conn.cursor() as cursor:
-        p00_rollup = {}
-        # Percorre todas as subpastas dentro da pasta raiz
-        for root, dirs, files in os.walk(PARENT_FOLDER):
-            for d in dirs:
-                job_folder = os.path.join(root, d)
-                try:
-                    process_job_folder(cursor, job_folder, p00_rollup)
-                except Exception as e:
-                    log_and_print(f"❌ Erro ao processar a pasta {job_folder}: {e}", "error")
-                    # continua para a próxima pasta sem parar tudo
-                    continue  
-
-        # Notificação agregada para P00 (status_id = 1)
-        if p00_rollup:
-            for imagem_id, roll in p00_rollup.items():
-                total_jobs = roll.get("total_jobs", 0)
-                completed_jobs = roll.get("completed_jobs", 0)
-                any_error = roll.get("any_error", False)
-                any_incomplete = roll.get("any_incomplete", False)
-                all_complete = roll.get("all_complete", False)
-
-                if any_error:
-                    status_agg = "Erro"
-                elif any_incomplete:
-                    status_agg = "Em andamento"
-                elif all_complete and total_jobs > 0:
-                    status_agg = "Em aprovação"
-                else:
-                    status_agg = "Desconhecido"
-
-                cursor.execute(
-                    "SELECT idrender_alta, status FROM render_alta WHERE imagem_id = %s AND status_id = 1 ORDER BY idrender_alta DESC LIMIT 1",
-                    (imagem_id,)
+    # Impressões digitais da execução anterior; --full ignora e reprocessa tudo
+    fingerprints = {} if full else load_json_state(JOB_FINGERPRINTS, {})
+    batch_size = int(os.getenv("JOB_BATCH_SIZE", "200"))
+    metrics.reset()
+    _start_run(workers)
+    try:
+        conn = db.connection()
+        with conn.cursor() as cursor:
+            runner = JobRunner(cursor, workers)
+            try:
+                # Percorre as pastas de job dentro da pasta raiz (pastas ocultas, como
+                # .scriptsflow com os arquivos de estado, são ignoradas)
+                p00_rollup, new_fingerprints = process_jobs(
+                    cursor, runner, discover_jobs(PARENT_FOLDER), fingerprints, batch_size
                 )
-                row = cursor.fetchone()
-                render_id = row[0] if row else None
-                ultimo_status = row[1] if row else None
-
-                # Atualiza status agregado no render_alta (mantém estado único por imagem)
-                if render_id:
-                    cursor.execute(
-                        "UPDATE render_alta SET status = %s WHERE idrender_alta = %s",
-                        (status_agg, render_id)
-                    )
+            finally:
+                runner.close()
+
+            finalize_p00_rollup(cursor, p00_rollup)
+            conn.commit()
+        # Só grava as impressões digitais depois que o banco confirmou as alterações
+        save_json_state(JOB_FINGERPRINTS, new_fingerprints)
+        save_log_scan_state()
+    finally:
+        _finish_run()
+        metrics.write()
+    log_run_summary()
+    log_and_print("Processamento concluído!")
 
-                resp_id = roll.get("resp_id")
-                image_name_db = roll.get("image_name_db")
-
-                # Enviar notificação apenas quando houver mudança real no status agregado
-                if resp_id and status_agg != ultimo_status:
-                    if status_agg == "Erro":
-                        msg = f"O render da imagem: {image_name_db} deu erro, favor verificar!"
-                    elif status_agg == "Em aprovação":
-                        msg = f"O render da imagem: {image_name_db} foi concluído com sucesso, favor aprovar!"
-                    elif status_agg == "Em andamento":
-                        msg = f"O render da imagem: {image_name_db} está em andamento."
+
+def watch(workers=1, interval=10.0, debounce=15.0, max_wait=120.0, retry_delay=600.0):
+    """Modo daemon: mantém as conexões abertas e processa só os jobs que mudaram.
+
+    A cada interval segundos a pasta raiz é varrida com discover_jobs (só
+    scandir/stat) e cada job é comparado com sua impressão digital. Um job
+    alterado espera debounce segundos sem novas alterações (no máximo max_wait)
+    antes de ser processado. Jobs que falharem só são tentados de novo após
+    retry_delay segundos, a menos que mudem outra vez. O acumulado do P00 é
+    recalculado, a partir das impressões digitais, só para as imagens afetadas.
+    """
+    log_and_print(f"👀 Observando a pasta: {PARENT_FOLDER} (intervalo {interval:g}s, debounce {debounce:g}s)")
+    state = load_json_state(JOB_FINGERPRINTS, {})
+    batch_size = int(os.getenv("JOB_BATCH_SIZE", "200"))
+    pending = {}
+    failed = {}
+    first_cycle = True
+    pruned_at = time.time()
+    _start_run(workers)
+    try:
+        conn = db.connection()
+        with conn.cursor() as cursor:
+            runner = JobRunner(cursor, workers)
+            try:
+                while True:
+                    cycle_start = time.time()
+                    # pastas de saída podem ter mudado desde o último ciclo
+                    output_folders.clear()
+                    # a conexão pode ter caído enquanto o daemon estava ocioso
+                    db.connection()
+
+                    if first_cycle:
+                        # primeira passada: igual a uma execução normal
+                        ready = list(discover_jobs(PARENT_FOLDER))
+                        seen = {job.path for job in ready}
                     else:
-                        msg = None
-
-                    if msg:
-                        send_webhook_message(msg)
-
-                        cursor.execute("SELECT nome_slack FROM usuario WHERE idcolaborador = %s", (resp_id,))
-                        slack_names = cursor.fetchall()
-                        for slack_name_tuple in slack_names:
-                            slack_name = slack_name_tuple[0]
-                            user_id = get_user_id_by_name(slack_name)
-                            if user_id:
-                                send_dm_to_user(user_id, msg)
-
-                        cursor.execute(
-                            "INSERT INTO notificacoes (colaborador_id, mensagem) VALUES (%s, %s)",
-                            (resp_id, msg)
-                        )
-                        log_and_print(f"🔔 Notificação P00 enviada para colaborador {resp_id} e canal de renders.")
-        conn.commit()
-    log_and_print("Processamento concluído!")
+                        ready = []
+                        seen = set()
+                        now = time.time()
+                        for job in discover_jobs(PARENT_FOLDER, log_skipped=False):
+                            seen.add(job.path)
+                            if not job.xml_file or not job.log_file:
+                                continue
+                            sig = [job.xml_sig, job.log_sig]
+                            if _job_unchanged(state, job.path, {"xml": job.xml_sig, "log": job.log_sig}):
+                                pending.pop(job.path, None)
+                                continue
+                            if job.path in failed and failed[job.path][0] == sig and now < failed[job.path][1]:
+                                continue
+                            entry = pending.get(job.path)
+                            if entry is None or entry["sig"] != sig:
+                                pending[job.path] = {
+                                    "job": job, "sig": sig,
+                                    "first": entry["first"] if entry else now, "last": now,
+                                }
+                        for path, entry in list(pending.items()):
+                            if path not in seen:
+                                del pending[path]
+                            elif now - entry["last"] >= debounce or now - entry["first"] >= max_wait:
+                                ready.append(entry["job"])
+                                del pending[path]
+
+                    # imagens cujo acumulado do P00 precisa ser recalculado. Jobs que sumiram
+                    # saem do estado; os prontos continuam nele, para que process_jobs pule os
+                    # que não mudaram (o registro só é descartado se o processamento falhar)
+                    affected = set()
+                    for path in [p for p in state if p not in seen] + [job.path for job in ready]:
+                        previous = state.pop(path, None) if path not in seen else state.get(path)
+                        if previous and previous.get("p00"):
+                            affected.add(previous["p00"]["imagem_id"])
+
+                    if ready:
+                        if not first_cycle:
+                            log_and_print(f"🔔 {len(ready)} job(s) alterado(s), processando")
+                        _, new_fingerprints = process_jobs(cursor, runner, ready, state, batch_size)
+                        now = time.time()
+                        for job in ready:
+                            if job.path in new_fingerprints:
+                                state[job.path] = new_fingerprints[job.path]
+                                failed.pop(job.path, None)
+                            else:
+                                state.pop(job.path, None)
+                                failed[job.path] = ([job.xml_sig, job.log_sig], now + retry_delay)
+                            record = state.get(job.path)
+                            if record and record.get("p00"):
+                                affected.add(record["p00"]["imagem_id"])
+
+                    if affected:
+                        p00_rollup = {}
+                        for record in state.values():
+                            if record.get("p00") and record["p00"]["imagem_id"] in affected:
+                                _accumulate_p00(p00_rollup, record["p00"])
+                        finalize_p00_rollup(cursor, p00_rollup)
+                        conn.commit()
+
+                    if ready or affected:
+                        save_json_state(JOB_FINGERPRINTS, state)
+                        save_log_scan_state()
+                        save_upload_manifest()
+                    # no modo daemon os contadores são acumulados desde o início
+                    metrics.write()
+                    if time.time() - pruned_at >= 3600:
+                        prune_derivatives()
+                        pruned_at = time.time()
+
+                    first_cycle = False
+                    time.sleep(max(0.0, interval - (time.time() - cycle_start)))
+            finally:
+                runner.close()
+    except KeyboardInterrupt:
+        log_and_print("⏹ Modo daemon interrompido")
+    finally:
+        _finish_run()
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Processa as pastas de job do Backburner")
+    parser.add_argument("--full", action="store_true",
+                        help="reprocessa todos os jobs, ignorando as impressões digitais salvas")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SCRIPTSFLOW_WORKERS", "1")),
+                        help="número de jobs processados em paralelo (cada um com sua conexão MySQL)")
+    parser.add_argument("--watch", action="store_true",
+                        help="modo daemon: fica observando a pasta e processa só os jobs alterados")
+    parser.add_argument("--interval", type=float, default=float(os.getenv("WATCH_INTERVAL", "10")),
+                        help="segundos entre duas verificações no modo daemon")
+    parser.add_argument("--debounce", type=float, default=float(os.getenv("WATCH_DEBOUNCE", "15")),
+                        help="segundos sem novas alterações antes de processar um job no modo daemon")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="mostra os detalhes de cada job (nível debug)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="só avisos e erros")
+    parser.add_argument("--profile", nargs="?", const=os.path.join(STATE_DIR, "profile.pstats"),
+                        help="grava um perfil cProfile da thread principal (padrão: STATE_DIR/profile.pstats)")
+    args = parser.parse_args()
+    if args.verbose:
+        set_log_level("debug")
+    elif args.quiet:
+        set_log_level("warning")
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        if args.watch:
+            watch(workers=max(1, args.workers), interval=args.interval, debounce=args.debounce)
+        else:
+            main(full=args.full, workers=max(1, args.workers))
+    finally:
+        if profiler:
+            profiler.disable()
+            os.makedirs(os.path.dirname(args.profile) or ".", exist_ok=True)
+            profiler.dump_stats(args.profile)
+            log_and_print(f"🧪 Perfil gravado em {args.profile} (abrir com python -m pstats)")
\ No newline at end of file
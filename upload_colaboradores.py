@@ -1,11 +1,32 @@
 import os
+import io
+import json
+import hashlib
+import argparse
+import threading
 from ftplib import FTP
+from concurrent.futures import ThreadPoolExecutor
 import pymysql
 from pathlib import Path
 
+try:
+    from PIL import Image
+except ImportError:  # sem Pillow as fotos são enviadas no tamanho original
+    Image = None
+
 PASTA_LOCAL = "./imagens_colaboradores"
 PASTA_REMOTA = "/www/sistema/uploads/colaboradores"
 
+# Hash de cada foto já enviada; fotos iguais não são reenviadas. Fica na pasta
+# de estado (a mesma variável do script.py), fora da pasta versionada das fotos
+STATE_DIR = os.getenv("SCRIPTSFLOW_STATE_DIR", "./.scriptsflow")
+MANIFESTO = os.path.join(STATE_DIR, "manifesto_upload_colaboradores.json")
+
+# Lado maior da foto enviada (avatar do Flow, com folga para telas de alta
+# densidade); mudar aqui invalida o manifesto e reenvia todas as fotos
+TAMANHO_AVATAR = 256
+FTP_SESSOES = 4
+
 FTP_CONFIG = {
     "host": "ftp.improov.com.br",
     "port": 21,
@@ -21,52 +42,176 @@ DB_CONFIG = {
     "charset": "utf8mb4"
 }
 
-def enviar_imagens():
-    # --- Conecta ao FTP ---
-    ftp = FTP()
-    ftp.connect(FTP_CONFIG["host"], FTP_CONFIG["port"])
-    ftp.login(FTP_CONFIG["user"], FTP_CONFIG["passwd"])
-    ftp.cwd(PASTA_REMOTA)
 
-    # --- Conecta ao banco ---
-    conn = pymysql.connect(**DB_CONFIG)
-    cursor = conn.cursor()
+def carregar_manifesto():
+    try:
+        with open(MANIFESTO, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def salvar_manifesto(manifesto):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    tmp = MANIFESTO + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, MANIFESTO)
+
+
+def hash_arquivo(caminho_local):
+    with open(caminho_local, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def preparar_imagem(caminho_local):
+    """Devolve os bytes a enviar, com a foto reduzida para TAMANHO_AVATAR."""
+    with open(caminho_local, "rb") as f:
+        original = f.read()
+    if Image is None:
+        return original
+
+    with Image.open(io.BytesIO(original)) as img:
+        if max(img.size) <= TAMANHO_AVATAR:
+            return original
+        formato = img.format or "PNG"
+        img.thumbnail((TAMANHO_AVATAR, TAMANHO_AVATAR), Image.LANCZOS)
+        saida = io.BytesIO()
+        if formato == "JPEG":
+            img.convert("RGB").save(saida, "JPEG", quality=85, optimize=True, progressive=True)
+        else:
+            img.save(saida, formato, optimize=True)
+    return saida.getvalue()
+
+
+_sessoes = threading.local()
+_todas_sessoes = []
+_sessoes_lock = threading.Lock()
+
 
+def sessao_ftp():
+    """Uma sessão FTP por thread, já posicionada em PASTA_REMOTA."""
+    ftp = getattr(_sessoes, "ftp", None)
+    if ftp is None:
+        ftp = FTP()
+        ftp.connect(FTP_CONFIG["host"], FTP_CONFIG["port"])
+        ftp.login(FTP_CONFIG["user"], FTP_CONFIG["passwd"])
+        ftp.cwd(PASTA_REMOTA)
+        _sessoes.ftp = ftp
+        with _sessoes_lock:
+            _todas_sessoes.append(ftp)
+    return ftp
+
+
+def enviar_arquivo(arquivo):
     try:
-        arquivos = [f for f in os.listdir(PASTA_LOCAL) if f.lower().endswith((".jpg", ".jpeg", ".png"))]
+        dados = preparar_imagem(os.path.join(PASTA_LOCAL, arquivo))
+        sessao_ftp().storbinary(f"STOR {arquivo}", io.BytesIO(dados))
+    except Exception as e:
+        # sessão com problema: descarta para a próxima tentativa abrir outra
+        _sessoes.ftp = None
+        print(f"❌ Falha ao enviar {arquivo}: {e}")
+        return False
+    print(f"✅ Enviado: {arquivo} ({len(dados) // 1024} KB)")
+    return True
 
-        for arquivo in arquivos:
-            nome_base = Path(arquivo).stem
-            caminho_local = os.path.join(PASTA_LOCAL, arquivo)
-            caminho_remoto = f"{PASTA_REMOTA}/{arquivo}"
 
-            # --- Envia o arquivo via FTP ---
-            with open(caminho_local, "rb") as f:
-                ftp.storbinary(f"STOR {arquivo}", f)
-            print(f"✅ Enviado: {arquivo}")
+def fechar_sessoes():
+    with _sessoes_lock:
+        sessoes = list(_todas_sessoes)
+        _todas_sessoes.clear()
+    for ftp in sessoes:
+        try:
+            ftp.quit()
+        except Exception:
+            ftp.close()
 
-            # caminho relativo que vai para o banco
-            caminho_banco = f"uploads/colaboradores/{arquivo}"
 
-            # --- Atualiza/inserir no banco ---
-            cursor.execute("SELECT idcolaborador FROM colaborador WHERE nome_colaborador = %s", (nome_base,))
-            existe = cursor.fetchone()
+def gravar_no_banco(cursor, registros):
+    """Grava (nome_colaborador, caminho) de todos os enviados de uma vez."""
+    cursor.execute(
+        "SHOW INDEX FROM colaborador WHERE Non_unique = 0 AND Column_name = 'nome_colaborador'"
+    )
+    if cursor.fetchone():
+        cursor.executemany(
+            "INSERT INTO colaborador (nome_colaborador, imagem) VALUES (%s, %s) "
+            "ON DUPLICATE KEY UPDATE imagem = VALUES(imagem)",
+            registros,
+        )
+        print(f"🧩 {len(registros)} colaboradores gravados no banco")
+        return
 
-            if existe:
-                cursor.execute("UPDATE colaborador SET imagem = %s WHERE nome_colaborador = %s", (caminho_banco, nome_base))
-                print(f"🧩 Atualizado no banco: {nome_base}")
-            else:
-                cursor.execute("INSERT INTO colaborador (nome_colaborador, imagem) VALUES (%s, %s)", (nome_base, caminho_banco))
-                print(f"🆕 Inserido no banco: {nome_base}")
+    # sem índice único em nome_colaborador o upsert duplicaria linhas: separa
+    # atualizações e inserções com uma única consulta
+    nomes = [nome for nome, _ in registros]
+    cursor.execute(
+        f"SELECT nome_colaborador FROM colaborador WHERE nome_colaborador IN ({', '.join(['%s'] * len(nomes))})",
+        nomes,
+    )
+    existentes = {row[0] for row in cursor.fetchall()}
+    atualizar = [(caminho, nome) for nome, caminho in registros if nome in existentes]
+    inserir = [(nome, caminho) for nome, caminho in registros if nome not in existentes]
+    if atualizar:
+        cursor.executemany("UPDATE colaborador SET imagem = %s WHERE nome_colaborador = %s", atualizar)
+    if inserir:
+        cursor.executemany("INSERT INTO colaborador (nome_colaborador, imagem) VALUES (%s, %s)", inserir)
+    print(f"🧩 Atualizados no banco: {len(atualizar)}, 🆕 inseridos: {len(inserir)}")
 
-            conn.commit()
 
+def enviar_imagens(forcar=False):
+    manifesto = {} if forcar else carregar_manifesto()
+    arquivos = sorted(f for f in os.listdir(PASTA_LOCAL) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+
+    # --- Só as fotos novas ou alteradas desde o último envio ---
+    pendentes = []
+    for arquivo in arquivos:
+        try:
+            sha1 = hash_arquivo(os.path.join(PASTA_LOCAL, arquivo))
+        except OSError as e:
+            print(f"❌ Erro ao ler {arquivo}: {e}")
+            continue
+        anterior = manifesto.get(arquivo)
+        if anterior and anterior.get("sha1") == sha1 and anterior.get("tamanho") == TAMANHO_AVATAR:
+            continue
+        pendentes.append((arquivo, sha1))
+
+    print(f"📷 {len(arquivos)} fotos, {len(pendentes)} para enviar")
+    if not pendentes:
+        return
+
+    # --- Reduz e envia via FTP em algumas sessões paralelas ---
+    try:
+        with ThreadPoolExecutor(max_workers=FTP_SESSOES) as executor:
+            resultados = list(executor.map(lambda p: enviar_arquivo(p[0]), pendentes))
+    finally:
+        fechar_sessoes()
+    enviados = [p for p, ok in zip(pendentes, resultados) if ok]
+    if not enviados:
+        return
+
+    # --- Atualiza/insere no banco numa única transação ---
+    conn = pymysql.connect(**DB_CONFIG)
+    try:
+        with conn.cursor() as cursor:
+            # caminho relativo que vai para o banco
+            registros = [(Path(arquivo).stem, f"uploads/colaboradores/{arquivo}") for arquivo, _ in enviados]
+            gravar_no_banco(cursor, registros)
+        conn.commit()
     except Exception as e:
+        conn.rollback()
         print("❌ Erro:", e)
+        return
     finally:
-        cursor.close()
         conn.close()
-        ftp.quit()
+
+    # só depois do commit as fotos contam como sincronizadas
+    for arquivo, sha1 in enviados:
+        manifesto[arquivo] = {"sha1": sha1, "tamanho": TAMANHO_AVATAR}
+    salvar_manifesto(manifesto)
+
 
 if __name__ == "__main__":
-    enviar_imagens()
+    parser = argparse.ArgumentParser(description="Envia as fotos dos colaboradores para o Flow")
+    parser.add_argument("--forcar", action="store_true", help="reenvia todas as fotos, ignorando o manifesto")
+    args = parser.parse_args()
+    enviar_imagens(forcar=args.forcar)